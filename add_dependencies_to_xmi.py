@@ -1,7 +1,13 @@
 import xml.etree.ElementTree as ET
-import uuid
+import xml.parsers.expat
 import sys
-from collections import defaultdict
+import os
+import shutil
+import tempfile
+import argparse
+import itertools
+from xmi_ids import RANDOM_IDS, DeterministicIds
+from xmi_stats import null_phase, profiling
 
 # Define namespaces
 NSMAP = {'UML': 'omg.org/UML1.3'}
@@ -10,13 +16,67 @@ UML = f'{{{UML_NS}}}'
 
 ET.register_namespace('UML', UML_NS)
 
-# Generate UUID
-def generate_uuid():
-    return str(uuid.uuid4()).upper()
+def tagged_value(tag, value):
+    """Create a TaggedValue element. value must already be a string."""
+    return ET.Element(f'{UML}TaggedValue', {'tag': tag, 'value': value})
+
+# Tagged values that are the same for every dependency, before and after the source and target names.
+# Dependencies that are serialized and discarded share these elements; see template_elements.
+DEPENDENCY_TAGGED_VALUES_HEAD = tuple(tagged_value(tag, value) for tag, value in [
+    ('style', '3'),
+    ('ea_type', 'Dependency'),
+    ('direction', 'Source -> Destination'),
+    ('linemode', '3'),
+    ('linecolor', '-1'),
+    ('linewidth', '0'),
+    ('seqno', '0'),
+    ('headStyle', '0'),
+    ('lineStyle', '0')
+])
+DEPENDENCY_TAGGED_VALUES_TAIL = tuple(tagged_value(tag, value) for tag, value in [
+    ('ea_sourceType', 'Class'),
+    ('ea_targetType', 'Class'),
+    ('src_visibility', 'Public'),
+    ('src_aggregation', '0'),
+    ('src_isOrdered', 'false'),
+    ('src_targetScope', 'instance'),
+    ('src_changeable', 'none'),
+    ('src_isNavigable', 'false'),
+    ('src_containment', 'Unspecified'),
+    ('dst_visibility', 'Public'),
+    ('dst_aggregation', '0'),
+    ('dst_isOrdered', 'false'),
+    ('dst_targetScope', 'instance'),
+    ('dst_changeable', 'none'),
+    ('dst_isNavigable', 'true'),
+    ('dst_containment', 'Unspecified'),
+    ('virtualInheritance', '0')
+])
+MULTIPLICITY_TAGGED_VALUES = tuple(tagged_value(tag, value) for tag, value in [
+    ('src_multiplicity', '1'),
+    ('dst_multiplicity', '0..*'),
+    ('lb', '1'),
+    ('rb', '0..*')
+])
+
+def copy_element(element):
+    """Return a copy of an element and its children. copy.copy would share the attribute dict."""
+    copied = ET.Element(element.tag, element.attrib)
+    copied.extend(copy_element(child) for child in element)
+    return copied
+
+def template_elements(elements, shared):
+    """Return template elements to append to a new element.
+
+    If shared is set, the template elements themselves are returned. This is faster,
+    but only safe when the new element is serialized and discarded, as a change to
+    one of them would show up everywhere they are used. Otherwise copies are returned.
+    """
+    return elements if shared else [copy_element(element) for element in elements]
 
 # Create Dependency Element
-def create_dependency_element(client_id, supplier_id, client_name, supplier_name, name=None, multiplicity=None, attr_guid=None):
-    dependency_id = f"EAID_{generate_uuid()}"
+def create_dependency_element(client_id, supplier_id, client_name, supplier_name, name=None, multiplicity=None, attr_guid=None, ids=RANDOM_IDS, shared=False):
+    dependency_id = f"EAID_{str(ids.uuid('dependency', client_id, supplier_id, name, attr_guid)).upper()}"
     dependency_attrs = {
         'xmi.id': dependency_id,
         'client': client_id,
@@ -29,193 +89,397 @@ def create_dependency_element(client_id, supplier_id, client_name, supplier_name
     dependency = ET.Element(f'{UML}Dependency', dependency_attrs)
 
     model_element = ET.SubElement(dependency, f'{UML}ModelElement.taggedValue')
-
-    tagged_values = [
-        ('style', '3'),
-        ('ea_type', 'Dependency'),
-        ('direction', 'Source -> Destination'),
-        ('linemode', '3'),
-        ('linecolor', '-1'),
-        ('linewidth', '0'),
-        ('seqno', '0'),
-        ('headStyle', '0'),
-        ('lineStyle', '0'),
-        ('ea_sourceName', client_name),
-        ('ea_targetName', supplier_name),
-        ('ea_sourceType', 'Class'),
-        ('ea_targetType', 'Class'),
-        ('src_visibility', 'Public'),
-        ('src_aggregation', '0'),
-        ('src_isOrdered', 'false'),
-        ('src_targetScope', 'instance'),
-        ('src_changeable', 'none'),
-        ('src_isNavigable', 'false'),
-        ('src_containment', 'Unspecified'),
-        ('dst_visibility', 'Public'),
-        ('dst_aggregation', '0'),
-        ('dst_isOrdered', 'false'),
-        ('dst_targetScope', 'instance'),
-        ('dst_changeable', 'none'),
-        ('dst_isNavigable', 'true'),
-        ('dst_containment', 'Unspecified'),
-        ('virtualInheritance', '0')
-    ]
-
-    for tag, value in tagged_values:
-        ET.SubElement(model_element, f'{UML}TaggedValue', {'tag': tag, 'value': value})
+    model_element.extend(template_elements(DEPENDENCY_TAGGED_VALUES_HEAD, shared))
+    model_element.append(tagged_value('ea_sourceName', client_name))
+    model_element.append(tagged_value('ea_targetName', supplier_name))
+    model_element.extend(template_elements(DEPENDENCY_TAGGED_VALUES_TAIL, shared))
 
     if multiplicity:
-        ET.SubElement(model_element, f'{UML}TaggedValue', {'tag': 'src_multiplicity', 'value': '1'})
-        ET.SubElement(model_element, f'{UML}TaggedValue', {'tag': 'dst_multiplicity', 'value': '0..*'})
-        ET.SubElement(model_element, f'{UML}TaggedValue', {'tag': 'lb', 'value': '1'})
-        ET.SubElement(model_element, f'{UML}TaggedValue', {'tag': 'rb', 'value': '0..*'})
+        model_element.extend(template_elements(MULTIPLICITY_TAGGED_VALUES, shared))
 
     if attr_guid:
-        ET.SubElement(model_element, f'{UML}TaggedValue', {'tag': 'styleex', 'value': f'LFSP={{{attr_guid}}}L;'})
+        model_element.append(tagged_value('styleex', f'LFSP={{{attr_guid}}}L;'))
 
     if name:
-        ET.SubElement(model_element, f'{UML}TaggedValue', {'tag': 'mt', 'value': name})
+        model_element.append(tagged_value('mt', name))
 
     return dependency
 
+# Dependency variants, in the order their dependencies are written to the model
+DEPENDENCY_VARIANTS = ('object', 'schema_composition_attribute', 'array', 'schema_composition_class')
+
+# Build a compact index of the model in a single walk
+def build_class_index(root):
+    """Walk the model once and collect everything the dependency handlers need.
+
+    Returns a tuple ``(classes, class_index)``. ``classes`` maps class names to
+    their ``xmi.id``; ``class_index`` is a list with one list of relations per
+    class in document order. A relation is a
+    ``(variant, class_name, class_id, target_class, name, attr_guid)`` tuple.
+    """
+    classes = {}
+    class_index = []
+    for cls in root.iter(f'{UML}Class'):
+        index_class(cls, classes, class_index)
+    return classes, class_index
+
+# Add one class and the relations of its attributes to the index
+def index_class(cls, classes, class_index):
+    class_name = cls.get('name')
+    class_id = cls.get('xmi.id')
+    classes[class_name] = {'xmi.id': class_id, 'name': class_name}
+    relations = []
+
+    for attr in cls.iter(f'{UML}Attribute'):
+        attr_type = style_value = attr_guid = None
+        for tagged_value in attr.iter(f'{UML}TaggedValue'):
+            tag = tagged_value.get('tag')
+            if tag == 'type' and attr_type is None:
+                attr_type = tagged_value.get('value')
+            elif tag == 'style' and style_value is None:
+                style_value = tagged_value.get('value')
+            elif tag == 'ea_guid' and attr_guid is None:
+                attr_guid = tagged_value.get('value')
+        if attr_type is not None and style_value is not None:
+            style_value = style_value.strip()
+            attr_guid = (attr_guid or '').strip('{}')
+            relations.extend(handle_object_dependencies(class_name, class_id, attr_type, style_value, attr_guid))
+            relations.extend(handle_schema_composition_attribute_dependencies(class_name, class_id, attr_type, style_value, attr_guid))
+            relations.extend(handle_array_dependencies(class_name, class_id, attr_type, style_value, attr_guid))
+
+    for tagged_value in cls.iterfind(f'{UML}ModelElement.taggedValue/{UML}TaggedValue'):
+        if tagged_value.get('tag') == 'alias':
+            relations.extend(handle_schema_composition_class_dependencies(class_name, class_id, tagged_value.get('value')))
+            break
+
+    class_index.append(relations)
+
+def split_expat_name(name):
+    """Split a name reported by expat as 'uri}local}prefix' into the ElementTree tag and the prefix."""
+    parts = name.split('}')
+    if len(parts) == 1:
+        return name, None
+    return f'{{{parts[0]}}}{parts[1]}', (parts[2] if len(parts) == 3 else None)
+
+class StreamingClassIndex:
+    """Build the class index of an XMI document in a single streaming pass.
+
+    expat reports every element, but only Class elements are built, one outermost
+    class at a time, and indexed as by build_class_index before they are discarded.
+    Memory is bounded by the index rather than by the document. The byte offset of
+    the end tag of the Namespace.ownedElement that add_dependencies appends to is
+    recorded, so that the dependencies can be inserted into a copy of the input.
+    """
+
+    def __init__(self):
+        self.classes = {}
+        self.class_index = []
+        self.package_name = None
+        self.encoding = 'utf-8'
+        self.container_prefix = None
+        self.container_has_children = False
+        self.insert_offset = None
+        self.depth = 0
+        self.open_packages = 0
+        self.open_classes = 0
+        self.container_depth = None
+        self.builder = None
+        # Documents use few distinct names, so each is split only once
+        self.names = {}
+        self.parser = xml.parsers.expat.ParserCreate(namespace_separator='}')
+        self.parser.namespace_prefixes = True
+        self.parser.XmlDeclHandler = self.xml_declaration
+        self.parser.StartElementHandler = self.start
+        self.parser.EndElementHandler = self.end
+
+    def parse(self, source, copy=None):
+        """Parse the binary stream source, writing what is read to copy if given."""
+        while True:
+            chunk = source.read(1024 * 1024)
+            if not chunk:
+                break
+            if copy is not None:
+                copy.write(chunk)
+            self.parser.Parse(chunk, False)
+        self.parser.Parse(b'', True)
+
+    def xml_declaration(self, version, encoding, standalone):
+        if encoding:
+            self.encoding = encoding
+
+    def split_name(self, name):
+        split = self.names.get(name)
+        if split is None:
+            split = self.names[name] = split_expat_name(name)
+        return split
+
+    def start(self, name, attributes):
+        tag, prefix = self.split_name(name)
+        self.depth += 1
+        if self.container_depth is not None and self.insert_offset is None:
+            self.container_has_children = True
+
+        if tag == f'{UML}Package':
+            if self.package_name is None:
+                self.package_name = attributes.get('name')
+            self.open_packages += 1
+        elif tag == f'{UML}Namespace.ownedElement' and self.open_packages and self.container_depth is None:
+            self.container_depth = self.depth
+            self.container_prefix = prefix
+
+        if tag == f'{UML}Class' or self.builder is not None:
+            if self.builder is None:
+                self.builder = ET.TreeBuilder()
+            if tag == f'{UML}Class':
+                self.open_classes += 1
+            self.builder.start(tag, {self.split_name(key)[0]: value for key, value in attributes.items()})
+
+    def end(self, name):
+        tag = self.split_name(name)[0]
+        if self.builder is not None:
+            self.builder.end(tag)
+            if tag == f'{UML}Class':
+                self.open_classes -= 1
+                if not self.open_classes:
+                    for cls in self.builder.close().iter(f'{UML}Class'):
+                        index_class(cls, self.classes, self.class_index)
+                    self.builder = None
+
+        if tag == f'{UML}Package':
+            self.open_packages -= 1
+        elif self.depth == self.container_depth and self.insert_offset is None:
+            # Points at the end tag, or just past the element if it is self-closing
+            self.insert_offset = self.parser.CurrentByteIndex
+        self.depth -= 1
+
+# Split "oneOf A, B" style values into the composition type and its target classes
+def split_schema_composition(value):
+    if value.startswith('oneOf'):
+        schema_type = 'oneOf'
+    elif value.startswith('allOf'):
+        schema_type = 'allOf'
+    elif value.startswith('anyOf'):
+        schema_type = 'anyOf'
+    else:
+        return None, []
+    target_classes = [target_class.strip() for target_class in value.replace(schema_type, '').strip().split(',')]
+    return schema_type, target_classes
+
 # Handle object attribute dependencies (Variant 1)
-def handle_object_dependencies(root, classes, namespace_owned_element):
-    for cls in root.findall(f".//{UML}Class"):
-        class_name = cls.get('name')
-        class_id = cls.get('xmi.id')
-
-        for attr in cls.findall(f".//{UML}Attribute"):
-            attr_type_tag = attr.find(f".//{UML}TaggedValue[@tag='type']")
-            style_tag = attr.find(f".//{UML}TaggedValue[@tag='style']")
-            ea_guid_tag = attr.find(f".//{UML}TaggedValue[@tag='ea_guid']")
-
-            if attr_type_tag is not None and style_tag is not None:
-                attr_type = attr_type_tag.get('value')
-                style_value = style_tag.get('value').strip()
-                attr_guid = ea_guid_tag.get('value').strip('{}')
-
-                if attr_type == 'object' and style_value in classes:
-                    supplier_id = classes[style_value]['xmi.id']
-                    supplier_name = style_value
-                    dependency = create_dependency_element(class_id, supplier_id, class_name, supplier_name, attr_guid=attr_guid)
-                    namespace_owned_element.append(dependency)
+def handle_object_dependencies(class_name, class_id, attr_type, style_value, attr_guid):
+    if attr_type == 'object':
+        return [('object', class_name, class_id, style_value, None, attr_guid)]
+    return []
 
 # Handle schema composition attribute dependencies (Variant 2)
-def handle_schema_composition_attribute_dependencies(root, classes, namespace_owned_element):
-    for cls in root.findall(f".//{UML}Class"):
-        class_name = cls.get('name')
-        class_id = cls.get('xmi.id')
-
-        for attr in cls.findall(f".//{UML}Attribute"):
-            attr_type_tag = attr.find(f".//{UML}TaggedValue[@tag='type']")
-            style_tag = attr.find(f".//{UML}TaggedValue[@tag='style']")
-            ea_guid_tag = attr.find(f".//{UML}TaggedValue[@tag='ea_guid']")
-
-            if attr_type_tag is not None and style_tag is not None:
-                attr_type = attr_type_tag.get('value')
-                style_value = style_tag.get('value').strip()
-                attr_guid = ea_guid_tag.get('value').strip('{}')
-
-                if style_value.startswith('oneOf'):
-                    schema_type = 'oneOf'
-                elif style_value.startswith('allOf'):
-                    schema_type = 'allOf'
-                elif style_value.startswith('anyOf'):
-                    schema_type = 'anyOf'
-                else:
-                    schema_type = None
-
-                if schema_type:
-                    target_classes = style_value.replace(schema_type, '').strip().split(',')
-                    for target_class in target_classes:
-                        target_class = target_class.strip()
-                        if target_class in classes:
-                            supplier_id = classes[target_class]['xmi.id']
-                            supplier_name = target_class
-                            dependency = create_dependency_element(class_id, supplier_id, class_name, supplier_name, name=schema_type, attr_guid=attr_guid)
-                            namespace_owned_element.append(dependency)
+def handle_schema_composition_attribute_dependencies(class_name, class_id, attr_type, style_value, attr_guid):
+    schema_type, target_classes = split_schema_composition(style_value)
+    return [('schema_composition_attribute', class_name, class_id, target_class, schema_type, attr_guid) for target_class in target_classes]
 
 # Handle for array dependencies (Variant 3)
-def handle_array_dependencies(root, classes, namespace_owned_element):
-    for cls in root.findall(f".//{UML}Class"):
-        class_name = cls.get('name')
-        class_id = cls.get('xmi.id')
-
-        for attr in cls.findall(f".//{UML}Attribute"):
-            attr_type_tag = attr.find(f".//{UML}TaggedValue[@tag='type']")
-            style_tag = attr.find(f".//{UML}TaggedValue[@tag='style']")
-            ea_guid_tag = attr.find(f".//{UML}TaggedValue[@tag='ea_guid']")
-
-            if attr_type_tag is not None and style_tag is not None:
-                attr_type = attr_type_tag.get('value')
-                style_value = style_tag.get('value').strip()
-                attr_guid = ea_guid_tag.get('value').strip('{}')
-
-                if attr_type == 'array':
-                    if style_value.startswith('Array of '):
-                        class_name_in_style = style_value.replace('Array of ', '').strip()
-                        if class_name_in_style in classes:
-                            supplier_id = classes[class_name_in_style]['xmi.id']
-                            supplier_name = class_name_in_style
-                            dependency = create_dependency_element(class_id, supplier_id, class_name, supplier_name, name='array', multiplicity=True, attr_guid=attr_guid)
-                            namespace_owned_element.append(dependency)
+def handle_array_dependencies(class_name, class_id, attr_type, style_value, attr_guid):
+    if attr_type == 'array' and style_value.startswith('Array of '):
+        class_name_in_style = style_value.replace('Array of ', '').strip()
+        return [('array', class_name, class_id, class_name_in_style, 'array', attr_guid)]
+    return []
 
 # Handle schema composition dependencies at class level
-def handle_schema_composition_class_dependencies(root, classes, namespace_owned_element):
-    for cls in root.findall(f".//{UML}Class"):
-        class_name = cls.get('name')
-        class_id = cls.get('xmi.id')
-
-        alias_tag = cls.find(f".//{UML}TaggedValue[@tag='alias']")
-
-        if alias_tag is not None:
-            alias_value = alias_tag.get('value').strip()
-
-            if alias_value.startswith('oneOf'):
-                schema_type = 'oneOf'
-            elif alias_value.startswith('allOf'):
-                schema_type = 'allOf'
-            elif alias_value.startswith('anyOf'):
-                schema_type = 'anyOf'
-            else:
-                schema_type = None
-
-            if schema_type:
-                target_classes = alias_value.replace(schema_type, '').strip().split(',')
-                for target_class in target_classes:
-                    target_class = target_class.strip()
-                    if target_class in classes:
-                        supplier_id = classes[target_class]['xmi.id']
-                        supplier_name = target_class
-                        dependency = create_dependency_element(class_id, supplier_id, class_name, supplier_name, name=schema_type)
-                        namespace_owned_element.append(dependency)
+def handle_schema_composition_class_dependencies(class_name, class_id, alias_value):
+    schema_type, target_classes = split_schema_composition(alias_value.strip())
+    return [('schema_composition_class', class_name, class_id, target_class, schema_type, None) for target_class in target_classes]
+
+# Resolve all dependency variants from the class index in one pass
+def resolve_dependencies(classes, class_index, ids=RANDOM_IDS, shared=False):
+    """Return the dependency elements for every relation whose target is a known class.
+
+    The variants are collected into separate lists so that the output keeps the
+    order of the original per-variant scans: all object dependencies first, then
+    composition attribute, array and composition class dependencies. Set shared if
+    the dependencies are only serialized; see template_elements.
+    """
+    return list(iter_dependencies(classes, class_index, ids=ids, shared=shared))
+
+def iter_dependencies(classes, class_index, ids=RANDOM_IDS, shared=False):
+    """Yield the dependency elements of resolve_dependencies, creating each one only when it is needed."""
+    for relation, supplier_id in order_relations(classes, class_index):
+        yield create_relation_dependency(relation, supplier_id, ids=ids, shared=shared)
+
+def order_relations(classes, class_index):
+    """Return (relation, supplier_id) for every relation whose target is a known class, in output order."""
+    relations_by_variant = {variant: [] for variant in DEPENDENCY_VARIANTS}
+    for relations in class_index:
+        for relation in relations:
+            if relation[3] in classes:
+                relations_by_variant[relation[0]].append((relation, classes[relation[3]]['xmi.id']))
+    return [pair for variant in DEPENDENCY_VARIANTS for pair in relations_by_variant[variant]]
+
+def create_relation_dependency(relation, supplier_id, ids=RANDOM_IDS, shared=False):
+    variant, class_name, class_id, target_class, name, attr_guid = relation
+    return create_dependency_element(class_id, supplier_id, class_name, target_class, name=name, multiplicity=(variant == 'array'), attr_guid=attr_guid, ids=ids, shared=shared)
+
+def relation_id_path(relation, supplier_id):
+    """Return the path of the uuid generated for the dependency of a relation."""
+    return ('dependency', relation[2], supplier_id, relation[4], relation[5])
 
 # Main function to add dependencies
-def add_dependencies(input_file, output_file):
-    tree = ET.parse(input_file)
-    root = tree.getroot()
-
-    # Find the Namespace.ownedElement to append dependencies
-    namespace_owned_element = root.find(f".//{UML}Package//{UML}Namespace.ownedElement")
+def add_dependencies(input_file, output_file, deterministic=False, phase=null_phase):
+    """Add dependencies to an XMI file. Either file may be '-' for stdin/stdout.
 
-    classes = {}
-    for cls in root.findall(f".//{UML}Class"):
-        class_name = cls.get('name')
-        classes[class_name] = {'xmi.id': cls.get('xmi.id'), 'name': class_name}
+    If deterministic is set, dependency ids are derived from the classes and attributes
+    they connect, matching convert_oas_to_xmi.py --deterministic --dependencies.
+    """
+    with phase('parse'):
+        tree = ET.parse(sys.stdin.buffer if input_file == '-' else input_file)
+    add_dependencies_to_root(tree.getroot(), deterministic=deterministic, shared=True)
 
-    # Call functions to handle each type of dependency
-    handle_object_dependencies(root, classes, namespace_owned_element)
-    handle_schema_composition_attribute_dependencies(root, classes, namespace_owned_element)
-    handle_array_dependencies(root, classes, namespace_owned_element)
-    handle_schema_composition_class_dependencies(root, classes, namespace_owned_element)
+    with phase('write'):
+        tree.write(sys.stdout.buffer if output_file == '-' else output_file, encoding="utf-8", xml_declaration=True)
 
-    tree.write(output_file, encoding="utf-8", xml_declaration=True)
+def add_dependencies_to_root(root, deterministic=False, shared=False):
+    """Add dependencies to a parsed XMI document. Set shared if the document is only serialized; see template_elements."""
+    # Find the Namespace.ownedElement to append dependencies
+    namespace_owned_element = root.find(f".//{UML}Package//{UML}Namespace.ownedElement")
+    ids = DeterministicIds(root.find(f".//{UML}Package").get('name')) if deterministic else RANDOM_IDS
+
+    # Index classes and attributes once, then resolve every type of dependency from the index
+    classes, class_index = build_class_index(root)
+    namespace_owned_element.extend(resolve_dependencies(classes, class_index, ids=ids, shared=shared))
+
+def add_dependencies_streaming(input_file, output_file, deterministic=False, phase=null_phase):
+    """Add dependencies to an XMI file without loading the document into memory. Either file may be '-'.
+
+    The input is indexed in one streaming pass, and the output is a copy of the input
+    with the dependencies inserted at the end of the package's Namespace.ownedElement.
+    For XMI written by convert_oas_to_xmi.py the result is identical to add_dependencies.
+    Documents the dependencies cannot be inserted into as text, such as ones with a
+    self-closing package element or another prefix for the UML namespace, are
+    handled by add_dependencies instead.
+    """
+    with (tempfile.TemporaryFile() if input_file == '-' else open(input_file, 'rb')) as source:
+        index = StreamingClassIndex()
+        with phase('parse'):
+            if input_file == '-':
+                # Keep a copy of stdin to copy the document from
+                index.parse(sys.stdin.buffer, copy=source)
+            else:
+                index.parse(source)
+
+        splice = index.insert_offset is not None and index.container_prefix == 'UML' and '<'.encode(index.encoding) == b'<'
+        if splice and not index.container_has_children:
+            source.seek(index.insert_offset - 2)
+            splice = source.read(2) != b'/>'
+
+        if not splice:
+            source.seek(0)
+            with phase('parse'):
+                tree = ET.parse(source)
+            add_dependencies_to_root(tree.getroot(), deterministic=deterministic, shared=True)
+            with phase('write'):
+                tree.write(sys.stdout.buffer if output_file == '-' else output_file, encoding="utf-8", xml_declaration=True)
+            return
+
+        ids = DeterministicIds(index.package_name) if deterministic else RANDOM_IDS
+        dependencies = iter_dependencies(index.classes, index.class_index, ids=ids, shared=True)
+
+        with phase('write'):
+            if output_file == '-':
+                splice_into(source, sys.stdout.buffer, index.insert_offset, dependencies, index.encoding)
+            else:
+                # The output may replace the input, so write it next to the output file first
+                fd, temporary_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_file)), suffix='.tmp')
+                try:
+                    with os.fdopen(fd, 'wb') as output:
+                        splice_into(source, output, index.insert_offset, dependencies, index.encoding)
+                    os.replace(temporary_file, output_file)
+                except BaseException:
+                    os.remove(temporary_file)
+                    raise
+
+# Fragments are serialized inside a wrapper so that the UML namespace is only declared on the root
+FRAGMENT_HEAD, FRAGMENT_TAIL = (f'<UML:Namespace.ownedElement xmlns:UML="{UML_NS}">', '</UML:Namespace.ownedElement>')
+
+def serialize_fragment(container):
+    """Serialize the children of a non-empty Namespace.ownedElement, without the element itself."""
+    return ET.tostring(container, encoding='unicode')[len(FRAGMENT_HEAD):-len(FRAGMENT_TAIL)]
+
+def write_in_batches(elements, output, encoding='utf-8', batch_size=1000):
+    """Serialize the elements of an iterable to the binary stream output.
+
+    The elements are serialized batch_size at a time, so that only a batch is held in
+    memory when they are created lazily, as by iter_dependencies.
+    """
+    elements = iter(elements)
+    while True:
+        batch = list(itertools.islice(elements, batch_size))
+        if not batch:
+            break
+        container = ET.Element(f'{UML}Namespace.ownedElement')
+        container.extend(batch)
+        output.write(serialize_fragment(container).encode(encoding, 'xmlcharrefreplace'))
+
+def splice_into(source, output, offset, dependencies, encoding):
+    """Copy the binary stream source to output, inserting the dependency elements at the byte offset.
+
+    The dependencies are serialized in batches, so only a batch is held in memory.
+    """
+    source.seek(0)
+    remaining = offset
+    while remaining:
+        chunk = source.read(min(remaining, 1024 * 1024))
+        if not chunk:
+            break
+        output.write(chunk)
+        remaining -= len(chunk)
+
+    write_in_batches(dependencies, output, encoding)
+    shutil.copyfileobj(source, output)
+
+def instrument_dependencies(stats):
+    """Wrap the dependency functions for a statistics report: the passes are timed as phases,
+    and the classes, attributes and relations indexed and the dependencies created are counted."""
+    module = sys.modules[__name__]
+
+    def count_class(counts, args, result):
+        counts['classes'] += 1
+
+    def count_attribute(counts, args, relations):
+        # The object handler is called exactly once per indexed attribute
+        counts['attributes'] += 1
+        counts['relations'] += len(relations)
+
+    def count_relations(counts, args, relations):
+        counts['relations'] += len(relations)
+
+    def count_dependency(counts, args, dependency):
+        counts['dependencies'] += 1
+        counts['tagged_values'] += len(dependency.find(f'{UML}ModelElement.taggedValue'))
+
+    stats.instrument(module, 'build_class_index')
+    stats.instrument(module, 'index_class', phase=False, count=count_class)
+    # The handlers run once per attribute, too often to be timed without slowing down the index they are part of
+    stats.instrument(module, 'handle_object_dependencies', phase=False, count=count_attribute)
+    for function_name in ('handle_schema_composition_attribute_dependencies', 'handle_array_dependencies', 'handle_schema_composition_class_dependencies'):
+        stats.instrument(module, function_name, phase=False, count=count_relations)
+    stats.instrument(module, 'resolve_dependencies')
+    stats.instrument(module, 'create_dependency_element', phase=False, count=count_dependency)
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python add_dependencies_to_xmi.py <input_file> <output_file>")
+    parser = argparse.ArgumentParser(description='Add dependencies between classes to an XMI file generated by convert_oas_to_xmi.py.')
+    parser.add_argument('input_file', help="input XMI file, or '-' to read from stdin")
+    parser.add_argument('output_file', help="output XMI file, or '-' to write to stdout")
+    parser.add_argument('--deterministic', action='store_true', help='derive dependency ids from the classes they connect instead of generating random UUIDs')
+    parser.add_argument('--stream', action='store_true', help='index the input in a single streaming pass and copy it with the dependencies inserted, instead of loading the whole document into memory')
+    parser.add_argument('--stats', metavar='REPORT_FILE', help="write a JSON report with the time per phase and the number of elements indexed and created ('-' for stderr)")
+    parser.add_argument('--trace-memory', action='store_true', help='also report the peak memory per phase in the --stats report; this slows the run down several times')
+    parser.add_argument('--profile', metavar='PROFILE_FILE', help='write a cProfile profile of the run, for use with pstats or snakeviz')
+    args = parser.parse_args()
+
+    if args.trace_memory and not args.stats:
+        print("--trace-memory requires --stats", file=sys.stderr if args.output_file == '-' else sys.stdout)
         sys.exit(1)
 
-    input_xmi_file = sys.argv[1]
-    output_xmi_file = sys.argv[2]
-    add_dependencies(input_xmi_file, output_xmi_file)
+    with profiling(args.stats, args.profile, instrument=instrument_dependencies, trace_memory=args.trace_memory) as phase:
+        if args.stream:
+            add_dependencies_streaming(args.input_file, args.output_file, deterministic=args.deterministic, phase=phase)
+        else:
+            add_dependencies(args.input_file, args.output_file, deterministic=args.deterministic, phase=phase)
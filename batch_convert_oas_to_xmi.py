@@ -0,0 +1,119 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from convert_oas_to_xmi import VALIDATION_LEVELS, load_spec, resolve_spec, spec_uri, validate, write_xmi
+from xmi_ids import RANDOM_IDS, DeterministicIds
+from xmi_cache import DEFAULT_CACHE_MAX_SIZE, cache_key, restore_from_cache, store_in_cache
+
+SPEC_EXTENSIONS = ('.yaml', '.yml', '.json')
+
+def find_specs(inputs):
+    """Expand directories and glob patterns to (input_file, relative_output_name) pairs.
+
+    Files found in a directory keep their path relative to that directory, so that
+    specs with the same name in different version folders do not collide.
+    """
+    specs = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            for directory, _, file_names in os.walk(pattern):
+                for file_name in sorted(file_names):
+                    if file_name.endswith(SPEC_EXTENSIONS):
+                        input_file = os.path.join(directory, file_name)
+                        specs.append((input_file, os.path.relpath(input_file, pattern)))
+        else:
+            for input_file in sorted(glob.glob(pattern, recursive=True)) or [pattern]:
+                specs.append((input_file, os.path.basename(input_file)))
+    return specs
+
+def convert_one(input_file, output_file, stream, dependencies, cache_dir=None, cache_max_size=DEFAULT_CACHE_MAX_SIZE, refresh_cache=False, deterministic=False, timestamp=None, validation='full', dedupe_inline=False):
+    """Convert a single spec in a worker process. Returns the time spent in each phase."""
+    timings = {}
+    base_name = os.path.splitext(os.path.basename(input_file))[0]
+    model_name = f"OAS_{base_name}"
+    ea_root_class_name = f"EARootClass_{base_name}"
+
+    start = time.perf_counter()
+    spec = resolve_spec(load_spec(input_file), input_file)
+    timings['load'] = time.perf_counter() - start
+
+    ids = DeterministicIds(model_name, timestamp) if deterministic else RANDOM_IDS
+    key = None
+    if cache_dir:
+        start = time.perf_counter()
+        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+        key = cache_key(spec, {'model_name': model_name, 'ea_root_class_name': ea_root_class_name, 'validation': validation, 'dependencies': dependencies, 'deterministic': deterministic, 'timestamp': ids.timestamp() if deterministic else None, 'dedupe_inline': dedupe_inline})
+        restored = not refresh_cache and restore_from_cache(cache_dir, key, output_file)
+        timings['cache'] = time.perf_counter() - start
+        if restored:
+            return timings
+
+    start = time.perf_counter()
+    validate(spec, validation, spec_uri(input_file))
+    timings['validate'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    write_xmi(spec, model_name, ea_root_class_name, output_file, stream=stream, dependencies=dependencies, ids=ids, dedupe_inline=dedupe_inline)
+    if key:
+        store_in_cache(cache_dir, key, output_file, cache_max_size)
+    timings['convert'] = time.perf_counter() - start
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert many OpenAPI specifications to Sparx XMI in parallel.')
+    parser.add_argument('inputs', nargs='+', help='spec files, directories or glob patterns')
+    parser.add_argument('-o', '--output-dir', required=True, help='directory the XMI files are written to')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='number of worker processes (defaults to the number of CPUs)')
+    parser.add_argument('--stream', action='store_true', help='write each class as soon as it is converted')
+    parser.add_argument('--without-dependencies', action='store_true', help='write the XMI without dependencies, as convert_oas_to_xmi.py does by default')
+    parser.add_argument('--dedupe-inline-classes', action='store_true', help='create a single class for structurally identical inline composition members, as for convert_oas_to_xmi.py')
+    parser.add_argument('--validation', choices=VALIDATION_LEVELS, default='full', help='validation level, as for convert_oas_to_xmi.py (default: %(default)s)')
+    parser.add_argument('--deterministic', action='store_true', help='derive ids from names and use a fixed timestamp, so unchanged specs give identical output')
+    parser.add_argument('--timestamp', help="timestamp used with --deterministic, as 'YYYY-MM-DD HH:MM:SS'")
+    parser.add_argument('--cache-dir', help='reuse the XMI generated for unchanged specifications from this directory')
+    parser.add_argument('--cache-max-size', type=int, default=DEFAULT_CACHE_MAX_SIZE // (1024 * 1024), help='maximum size of the cache in MB (default: %(default)s)')
+    parser.add_argument('--refresh-cache', action='store_true', help='ignore cached XMI and regenerate every specification')
+    args = parser.parse_args()
+
+    specs = find_specs(args.inputs)
+    if not specs:
+        print("No specifications found.")
+        sys.exit(1)
+
+    failures = []
+    jobs = {}
+    output_files = set()
+    batch_start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for input_file, relative_name in specs:
+            output_file = os.path.join(args.output_dir, os.path.splitext(relative_name)[0] + '.xmi')
+            if output_file in output_files:
+                failures.append(input_file)
+                print(f"FAILED {input_file}: output file {output_file} is already used by another input")
+                continue
+            output_files.add(output_file)
+            jobs[executor.submit(convert_one, input_file, output_file, args.stream, not args.without_dependencies, args.cache_dir, args.cache_max_size * 1024 * 1024, args.refresh_cache, args.deterministic, args.timestamp, args.validation, args.dedupe_inline_classes)] = (input_file, output_file)
+
+        for future in as_completed(jobs):
+            input_file, output_file = jobs[future]
+            try:
+                timings = future.result()
+            except Exception as e:
+                failures.append(input_file)
+                # Validation errors include the whole failing schema; the first line is enough here
+                message = str(e).splitlines()[0] if str(e) else ''
+                print(f"FAILED {input_file}: {type(e).__name__}: {message}")
+                continue
+            phases = ', '.join(f"{phase} {seconds:.3f}s" for phase, seconds in timings.items())
+            print(f"OK     {input_file} -> {output_file} ({phases})")
+
+    print(f"Converted {len(specs) - len(failures)} of {len(specs)} specifications in {time.perf_counter() - batch_start:.3f}s")
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
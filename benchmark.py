@@ -0,0 +1,180 @@
+import argparse
+import gc
+import io
+import json
+import random
+import sys
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from openapi_spec_validator import validate_spec
+from convert_oas_to_xmi import json_to_xmi
+from add_dependencies_to_xmi import UML, build_class_index, resolve_dependencies
+
+COMPOSITION_TYPES = ('oneOf', 'allOf', 'anyOf')
+
+# Generate a synthetic OpenAPI specification
+def generate_spec(schema_count, properties_per_schema, ref_ratio=0.25, array_ratio=0.15, composition_ratio=0.1, fan_out=2, inline_ratio=0.0, seed=0):
+    """Build a reproducible synthetic spec.
+
+    Each property is a $ref with probability ref_ratio, an array of $ref with
+    probability array_ratio, a oneOf/allOf/anyOf with fan_out members with probability
+    composition_ratio, and a plain string otherwise. Composition members are inline
+    titled schemas with probability inline_ratio. References only point to earlier
+    schemas, so that reference chains stay short enough for validate_spec.
+    """
+    rng = random.Random(seed)
+    schemas = {}
+
+    def ref_to_earlier(i):
+        return {'$ref': f'#/components/schemas/Schema{rng.randrange(i) if i else 0}'}
+
+    for i in range(schema_count):
+        properties = {}
+        for j in range(properties_per_schema):
+            choice = rng.random()
+            if choice < ref_ratio:
+                properties[f'prop{j}'] = ref_to_earlier(i)
+            elif choice < ref_ratio + array_ratio:
+                properties[f'prop{j}'] = {'type': 'array', 'items': ref_to_earlier(i)}
+            elif choice < ref_ratio + array_ratio + composition_ratio:
+                members = []
+                for k in range(fan_out):
+                    if rng.random() < inline_ratio:
+                        members.append({'title': f'Inline{k}', 'type': 'object', 'properties': {'value': {'type': 'string'}}})
+                    else:
+                        members.append(ref_to_earlier(i))
+                properties[f'prop{j}'] = {COMPOSITION_TYPES[j % len(COMPOSITION_TYPES)]: members}
+            else:
+                properties[f'prop{j}'] = {'type': 'string', 'maxLength': 35, 'description': f'Property {j}', 'example': 'ABC'}
+        schemas[f'Schema{i}'] = {'type': 'object', 'description': f'Schema {i}', 'properties': properties}
+    return {'openapi': '3.0.3', 'info': {'title': 'Benchmark', 'version': '1.0.0'}, 'paths': {}, 'components': {'schemas': schemas}}
+
+def add_dependencies_to_bytes(xmi_bytes):
+    """The add_dependencies_to_xmi.py pipeline on an in-memory file: parse, index, resolve."""
+    root = ET.fromstring(xmi_bytes)
+    namespace_owned_element = root.find(f".//{UML}Package//{UML}Namespace.ownedElement")
+    classes, class_index = build_class_index(root)
+    namespace_owned_element.extend(resolve_dependencies(classes, class_index))
+    return root
+
+def serialize(xmi_root):
+    output = io.BytesIO()
+    ET.ElementTree(xmi_root).write(output, encoding='utf-8', xml_declaration=True)
+    return output.getvalue()
+
+def measure(function, *args, track_memory=False):
+    """Run function once and return (result, seconds, peak bytes or None)."""
+    gc.collect()
+    if track_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args)
+    seconds = time.perf_counter() - start
+    peak = None
+    if track_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, seconds, peak
+
+def run_scenario(params, repeat=1, validate=True, track_memory=True):
+    """Time each stage of the transform for one set of generator parameters."""
+    spec = generate_spec(**params)
+    result = {'params': params, 'attributes': params['schema_count'] * params['properties_per_schema'], 'seconds': {}, 'peak_memory': {}}
+
+    stages = []
+    if validate:
+        stages.append(('validate_spec', lambda: validate_spec(spec)))
+    stages.append(('json_to_xmi', lambda: json_to_xmi(spec, 'OAS_Benchmark', 'EARootClass_Benchmark')))
+    xmi_root = json_to_xmi(spec, 'OAS_Benchmark', 'EARootClass_Benchmark')
+    stages.append(('serialize', lambda: serialize(xmi_root)))
+    xmi_bytes = serialize(xmi_root)
+    stages.append(('add_dependencies', lambda: add_dependencies_to_bytes(xmi_bytes)))
+    stages.append(('json_to_xmi_with_dependencies', lambda: json_to_xmi(spec, 'OAS_Benchmark', 'EARootClass_Benchmark', dependencies=True)))
+
+    for stage, function in stages:
+        try:
+            result['seconds'][stage] = min(measure(function)[1] for _ in range(repeat))
+            if track_memory:
+                result['peak_memory'][stage] = measure(function, track_memory=True)[2]
+        except RecursionError:
+            # validate_spec follows reference chains recursively
+            result['seconds'][stage] = None
+    return result
+
+def format_stages(entry):
+    """Describe the stage timings, including the time per attribute so that superlinear stages stand out."""
+    stages = []
+    for stage, seconds in entry['seconds'].items():
+        if seconds is None:
+            stages.append(f"{stage} n/a")
+        else:
+            stages.append(f"{stage} {seconds:.3f}s ({seconds / entry['attributes'] * 1e6:.1f}us/attr)")
+    return ', '.join(stages)
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Print the change against a stored baseline. Returns the list of regressions."""
+    baseline_by_params = {json.dumps(entry['params'], sort_keys=True): entry for entry in baseline['results']}
+    regressions = []
+    for entry in results:
+        previous = baseline_by_params.get(json.dumps(entry['params'], sort_keys=True))
+        if previous is None:
+            continue
+        for stage, seconds in entry['seconds'].items():
+            previous_seconds = previous['seconds'].get(stage)
+            if seconds is None or not previous_seconds:
+                continue
+            ratio = seconds / previous_seconds
+            marker = ''
+            if ratio > 1 + tolerance:
+                marker = '  REGRESSION'
+                regressions.append((entry['attributes'], stage, ratio))
+            print(f"{entry['attributes']:>8} attributes  {stage:<30} {previous_seconds:8.3f}s -> {seconds:8.3f}s ({ratio:5.2f}x){marker}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark both transform stages on synthetic OpenAPI specifications.')
+    parser.add_argument('--schemas', type=int, nargs='+', default=[100, 200, 500, 1000, 2000, 5000], help='schema counts to benchmark, one scenario each (default: up to 50k attributes)')
+    parser.add_argument('--properties', type=int, default=10, help='properties per schema (default: %(default)s)')
+    parser.add_argument('--ref-ratio', type=float, default=0.25, help='fraction of properties that are $ref (default: %(default)s)')
+    parser.add_argument('--array-ratio', type=float, default=0.15, help='fraction of properties that are arrays of $ref (default: %(default)s)')
+    parser.add_argument('--composition-ratio', type=float, default=0.1, help='fraction of properties that are oneOf/allOf/anyOf (default: %(default)s)')
+    parser.add_argument('--fan-out', type=int, default=2, help='members per composition (default: %(default)s)')
+    parser.add_argument('--inline-ratio', type=float, default=0.0, help='fraction of composition members that are inline titled schemas (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help='runs per stage; the fastest is reported (default: %(default)s)')
+    parser.add_argument('--skip-validation', action='store_true', help='do not time validate_spec, which dominates on large specs')
+    parser.add_argument('--skip-memory', action='store_true', help='do not measure peak memory, which needs an extra run per stage')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='compare against results previously written with --output')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='slowdown against the baseline reported as a regression (default: %(default)s)')
+    args = parser.parse_args()
+
+    results = []
+    for schema_count in args.schemas:
+        params = {
+            'schema_count': schema_count,
+            'properties_per_schema': args.properties,
+            'ref_ratio': args.ref_ratio,
+            'array_ratio': args.array_ratio,
+            'composition_ratio': args.composition_ratio,
+            'fan_out': args.fan_out,
+            'inline_ratio': args.inline_ratio,
+            'seed': args.seed,
+        }
+        entry = run_scenario(params, repeat=args.repeat, validate=not args.skip_validation, track_memory=not args.skip_memory)
+        results.append(entry)
+        print(f"{entry['attributes']:>8} attributes: {format_stages(entry)}", flush=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version, 'results': results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import xml.etree.ElementTree as ET
+import sys
+import time
+from convert_oas_to_xmi import json_to_xmi
+from add_dependencies_to_xmi import UML, build_class_index, resolve_dependencies, create_dependency_element
+from benchmark import generate_spec
+
+# The previous implementation: one full-tree rescan per dependency variant
+def legacy_add_dependencies(root):
+    namespace_owned_element = root.find(f".//{UML}Package//{UML}Namespace.ownedElement")
+    classes = {cls.get('name'): {'xmi.id': cls.get('xmi.id')} for cls in root.findall(f".//{UML}Class")}
+
+    for variant in ('object', 'composition', 'array'):
+        for cls in root.findall(f".//{UML}Class"):
+            for attr in cls.findall(f".//{UML}Attribute"):
+                attr_type_tag = attr.find(f".//{UML}TaggedValue[@tag='type']")
+                style_tag = attr.find(f".//{UML}TaggedValue[@tag='style']")
+                ea_guid_tag = attr.find(f".//{UML}TaggedValue[@tag='ea_guid']")
+                if attr_type_tag is None or style_tag is None:
+                    continue
+                attr_type = attr_type_tag.get('value')
+                style_value = style_tag.get('value').strip()
+                attr_guid = ea_guid_tag.get('value').strip('{}')
+                if variant == 'object' and attr_type == 'object' and style_value in classes:
+                    targets, name = [style_value], None
+                elif variant == 'composition' and style_value[:5] in ('oneOf', 'allOf', 'anyOf'):
+                    targets, name = [t.strip() for t in style_value[5:].split(',')], style_value[:5]
+                elif variant == 'array' and attr_type == 'array' and style_value.startswith('Array of '):
+                    targets, name = [style_value[len('Array of '):].strip()], 'array'
+                else:
+                    continue
+                for target in targets:
+                    if target in classes:
+                        namespace_owned_element.append(create_dependency_element(cls.get('xmi.id'), classes[target]['xmi.id'], cls.get('name'), target, name=name, multiplicity=(name == 'array'), attr_guid=attr_guid))
+
+    for cls in root.findall(f".//{UML}Class"):
+        alias_tag = cls.find(f".//{UML}TaggedValue[@tag='alias']")
+        if alias_tag is not None and alias_tag.get('value')[:5] in ('oneOf', 'allOf', 'anyOf'):
+            for target in alias_tag.get('value')[5:].split(','):
+                target = target.strip()
+                if target in classes:
+                    namespace_owned_element.append(create_dependency_element(cls.get('xmi.id'), classes[target]['xmi.id'], cls.get('name'), target, name=alias_tag.get('value')[:5]))
+    return len(namespace_owned_element.findall(f'{UML}Dependency'))
+
+# The current implementation: one indexing walk, one resolution pass
+def indexed_add_dependencies(root):
+    namespace_owned_element = root.find(f".//{UML}Package//{UML}Namespace.ownedElement")
+    classes, class_index = build_class_index(root)
+    namespace_owned_element.extend(resolve_dependencies(classes, class_index))
+    return len(namespace_owned_element.findall(f'{UML}Dependency'))
+
+def time_call(function, xmi_bytes):
+    root = ET.fromstring(xmi_bytes)
+    start = time.perf_counter()
+    dependency_count = function(root)
+    return time.perf_counter() - start, dependency_count
+
+def main():
+    schema_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    properties_per_schema = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+
+    spec = generate_spec(schema_count, properties_per_schema, ref_ratio=0.25, array_ratio=0.25, composition_ratio=0.25)
+    xmi_bytes = ET.tostring(json_to_xmi(spec, 'OAS_Benchmark', 'EARootClass_Benchmark'))
+    print(f"Synthetic spec: {schema_count} schemas, {schema_count * properties_per_schema} attributes")
+
+    legacy_time, legacy_count = time_call(legacy_add_dependencies, xmi_bytes)
+    indexed_time, indexed_count = time_call(indexed_add_dependencies, xmi_bytes)
+    print(f"Four full-tree rescans: {legacy_time:.3f}s ({legacy_count} dependencies)")
+    print(f"Single-pass index:      {indexed_time:.3f}s ({indexed_count} dependencies)")
+    print(f"Speedup: {legacy_time / indexed_time:.1f}x")
+
+if __name__ == "__main__":
+    main()
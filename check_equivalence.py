@@ -0,0 +1,171 @@
+import argparse
+import copy
+import io
+import json
+import os
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+from add_dependencies_to_xmi import UML, add_dependencies, add_dependencies_streaming
+from benchmark import generate_spec
+from convert_oas_to_xmi import IncrementalConverter, convert_watched, write_xmi_to_stream
+from delta_oas_to_xmi import json_to_delta_xmi
+from xmi_api import add_dependencies_to_bytes
+from xmi_ids import DeterministicIds
+
+MODEL_NAME = 'OAS_Check'
+EA_ROOT_CLASS_NAME = 'EARootClass_Check'
+
+def add_class_compositions(spec, every=7):
+    """Give every few schemas a class level oneOf, whose inline member has the same name as an inline class of an attribute.
+
+    The classes of class level compositions are written after all schema classes, so
+    their repeated ids are numbered in another run than the first occurrence when the
+    conversion is split across processes.
+    """
+    schemas = spec['components']['schemas']
+    for i, schema in enumerate(schemas.values()):
+        if i % every == every - 1:
+            schema['oneOf'] = [
+                {'title': 'Inline0', 'type': 'object', 'properties': {'value': {'type': 'string'}}},
+                {'$ref': '#/components/schemas/Schema0'},
+            ]
+    return spec
+
+def edited_versions(spec):
+    """Yield successive edits of spec, each building on the previous one, with a description."""
+    spec = copy.deepcopy(spec)
+    schemas = spec['components']['schemas']
+
+    # Later units move to other local ids
+    schemas['Schema1']['properties']['added'] = {'type': 'array', 'items': {'$ref': '#/components/schemas/Schema0'}}
+    yield 'attribute added to an early schema', copy.deepcopy(spec)
+
+    del schemas[f'Schema{len(schemas) // 2}']
+    yield 'schema removed', copy.deepcopy(spec)
+
+    # With shared inline classes, the class of an identical member in a later schema moves to this one
+    first = {'type': 'object', 'properties': {'value': {'oneOf': [
+        {'title': 'Inline0', 'type': 'object', 'properties': {'value': {'type': 'string'}}},
+        {'$ref': '#/components/schemas/Schema0'},
+    ]}}}
+    spec['components']['schemas'] = {'First': first, **schemas}
+    yield 'schema with a common inline member added first', copy.deepcopy(spec)
+
+def convert(spec, dedupe_inline, **options):
+    """Convert spec with deterministic ids and return the XMI file contents."""
+    output = io.BytesIO()
+    write_xmi_to_stream(spec, MODEL_NAME, EA_ROOT_CLASS_NAME, output, ids=DeterministicIds(MODEL_NAME), dedupe_inline=dedupe_inline, **options)
+    return output.getvalue()
+
+def two_step(spec, dedupe_inline, add=None):
+    """Convert spec without dependencies and add them with add, one of the functions of add_dependencies_to_xmi.py, through files.
+
+    Without add, they are added in memory with xmi_api.add_dependencies_to_bytes.
+    """
+    xmi = convert(spec, dedupe_inline)
+    if add is None:
+        return add_dependencies_to_bytes(xmi, deterministic=True)
+    with tempfile.TemporaryDirectory() as directory:
+        input_file = os.path.join(directory, 'input.xmi')
+        output_file = os.path.join(directory, 'output.xmi')
+        with open(input_file, 'wb') as f:
+            f.write(xmi)
+        add(input_file, output_file, deterministic=True)
+        with open(output_file, 'rb') as f:
+            return f.read()
+
+def save_in_place(path, spec):
+    """Overwrite a specification file without replacing it, as editors that truncate and rewrite a file do."""
+    with open(path, 'a+b') as f:
+        f.truncate(0)
+        f.write(json.dumps(spec).encode('utf-8'))
+
+def difference(expected, actual):
+    """Describe where actual first differs from expected, or return None if they are equal."""
+    if expected == actual:
+        return None
+    position = next((i for i, (a, b) in enumerate(zip(expected, actual)) if a != b), min(len(expected), len(actual)))
+    return f"differs at byte {position} of {len(expected)}: {actual[max(0, position - 40):position + 40]!r}"
+
+def comparable_elements(xmi_root):
+    """Return the serialized classes and dependencies of a package, without the local ids that move when earlier classes change."""
+    elements = set()
+    for element in xmi_root.find(f'.//{UML}Package/{UML}Namespace.ownedElement'):
+        element = copy.deepcopy(element)
+        for attribute in element.iter(f'{UML}Attribute'):
+            del attribute.attrib['xmi.id']
+        for container in element.iter(f'{UML}ModelElement.taggedValue'):
+            for tagged_value in list(container):
+                if tagged_value.get('tag') == 'ea_localid':
+                    container.remove(tagged_value)
+        elements.add(ET.tostring(element))
+    return elements
+
+def check_delta(old_spec, spec, dedupe_inline):
+    """Check that the delta between two versions contains every class and dependency that changed between their full conversions."""
+    changed = comparable_elements(ET.fromstring(convert(spec, dedupe_inline, dependencies=True))) - comparable_elements(ET.fromstring(convert(old_spec, dedupe_inline, dependencies=True)))
+    delta_root = json_to_delta_xmi(old_spec, spec, MODEL_NAME, EA_ROOT_CLASS_NAME, DeterministicIds(MODEL_NAME), dedupe_inline)[0]
+    missing = changed - comparable_elements(delta_root)
+    if missing:
+        return f"{len(missing)} changed elements missing, such as {sorted(missing)[0][:120]!r}"
+    return None
+
+def run_checks(spec, workers):
+    """Run every check on spec, with and without shared inline classes. Returns the number of failures."""
+    failures = 0
+
+    def report(name, problem):
+        nonlocal failures
+        if problem:
+            failures += 1
+            print(f"FAILED {name}: {problem}", flush=True)
+        else:
+            print(f"OK     {name}", flush=True)
+
+    for dedupe_inline in (False, True):
+        suffix = ' (shared inline classes)' if dedupe_inline else ''
+        expected = convert(spec, dedupe_inline, dependencies=True)
+        report(f'stream{suffix}', difference(expected, convert(spec, dedupe_inline, dependencies=True, stream=True)))
+        report(f'{workers} workers{suffix}', difference(expected, convert(spec, dedupe_inline, dependencies=True, workers=workers)))
+        report(f'two-step{suffix}', difference(expected, two_step(spec, dedupe_inline)))
+        report(f'two-step from a file{suffix}', difference(expected, two_step(spec, dedupe_inline, add_dependencies)))
+        report(f'two-step streaming{suffix}', difference(expected, two_step(spec, dedupe_inline, add_dependencies_streaming)))
+
+        # Every version is saved to the same file and converted by one converter, as --watch does
+        converter = IncrementalConverter(MODEL_NAME, EA_ROOT_CLASS_NAME, dependencies=True, ids=DeterministicIds(MODEL_NAME), dedupe_inline=dedupe_inline)
+        with tempfile.TemporaryDirectory() as directory:
+            args = argparse.Namespace(input_file=os.path.join(directory, 'spec.json'), output_file=os.path.join(directory, 'spec.xmi'), validation='none', dependencies=True)
+            previous = None
+            for description, version in [(None, spec), *edited_versions(spec)]:
+                save_in_place(args.input_file, version)
+                log = io.StringIO()
+                convert_watched(converter, args, log)
+                with open(args.output_file, 'rb') as f:
+                    problem = difference(convert(version, dedupe_inline, dependencies=True), f.read())
+                if problem and 'XMI file written' not in log.getvalue():
+                    problem = log.getvalue().strip()
+                report(f'watch after {description}{suffix}' if description else f'watch{suffix}', problem)
+                if previous is not None:
+                    report(f'delta after {description}{suffix}', check_delta(previous, version, dedupe_inline))
+                previous = version
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that all ways of converting a synthetic specification give identical XMI.')
+    parser.add_argument('--schemas', type=int, default=300, help='number of schemas (default: %(default)s)')
+    parser.add_argument('--properties', type=int, default=10, help='properties per schema (default: %(default)s)')
+    parser.add_argument('--inline-ratio', type=float, default=0.5, help='fraction of composition members that are inline titled schemas (default: %(default)s)')
+    parser.add_argument('-j', '--workers', type=int, default=2, help='number of processes for the parallel conversion (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    spec = add_class_compositions(generate_spec(args.schemas, args.properties, inline_ratio=args.inline_ratio, seed=args.seed))
+    failures = run_checks(spec, max(2, args.workers))
+    if failures:
+        print(f"{failures} checks failed")
+        sys.exit(1)
+    print("All checks passed")
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,36 @@
 import json
 import xml.etree.ElementTree as ET
-import uuid
 import yaml
-import datetime
 import sys
 import os
-from openapi_spec_validator import validate_spec
-from openapi_spec_validator.validation.exceptions import OpenAPIValidationError
+import argparse
+import time
+import io
+import itertools
+import pathlib
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from openapi_spec_validator import validate as validate_openapi
+from openapi_spec_validator.validation.exceptions import OpenAPISpecValidatorError, OpenAPIValidationError, ValidatorDetectError
+from referencing.exceptions import Unresolvable
+from add_dependencies_to_xmi import create_relation_dependency, iter_dependencies, order_relations, relation_id_path, resolve_dependencies, serialize_fragment, tagged_value, template_elements, write_in_batches
+from xmi_ids import RANDOM_IDS, DeterministicIds, SharedIds, fork_ids
+from xmi_model import build_model, class_fingerprint, model_relations
+from xmi_refs import DocumentCache, ExternalRefResolver, UnresolvableReferenceError, resolve_external_refs
+from xmi_cache import DEFAULT_CACHE_MAX_SIZE, cache_key, restore_from_cache, store_in_cache
+from xmi_stats import null_phase, profiling
+
+# Use the libyaml and orjson parsers when they are installed, they are many times faster
+try:
+    from yaml import CSafeLoader as YAMLLoader
+except ImportError:
+    from yaml import SafeLoader as YAMLLoader
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Define namespaces
 NSMAP = {'UML': 'omg.org/UML1.3'}
@@ -36,136 +60,137 @@ def add_tagged_values_to_element(element, tagged_values):
         if tag != 'author':  # Skip the author tag
             tagged_value_container.append(create_tagged_value('TaggedValue', {'tag': tag, 'value': ('' if value is None else str(value))}))
 
-def create_class_element(class_name, parent_element, element_id_counter, package_id, description, model_name):
-    """Helper function to create a class element."""
-    class_id = f'EAID_{str(uuid.uuid4()).replace("-", "_").upper()}'
-    class_element = create_xmi_element('Class', {
+class ClassTemplate:
+    """The XML attributes and tagged values that are the same for every class of a package.
+
+    Built once per conversion, so the timestamp is formatted once and only the name,
+    ids, local id and documentation are created per class. If shared is set, all
+    classes share the template elements, which is only safe for classes that are
+    serialized and discarded (see add_dependencies_to_xmi.template_elements);
+    otherwise every class gets copies.
+    """
+    __slots__ = ('package_id', 'head', 'element_type', 'shared')
+
+    def __init__(self, package_id, model_name, timestamp, shared=False):
+        self.package_id = '' if package_id is None else package_id
+        self.shared = shared
+        self.head = tuple(tagged_value(tag, value) for tag, value in [
+            ('isSpecification', 'false'),
+            ('ea_stype', 'Class'),
+            ('ea_ntype', '0'),
+            ('version', '1.0'),
+            ('package', self.package_id),
+            ('date_created', timestamp),
+            ('date_modified', timestamp),
+            ('gentype', 'Java'),
+            ('tagged', '0'),
+            ('package_name', model_name),
+            ('phase', '1.0'),
+            ('complexity', '1'),
+            ('status', 'Proposed'),
+            ('tpos', '0')
+        ])
+        self.element_type = (tagged_value('ea_eleType', 'element'),)
+
+    def elements(self, elements):
+        return template_elements(elements, self.shared)
+
+# Parts of every attribute that never vary, used like the elements of the class template
+ATTRIBUTE_TYPE = (create_xmi_element('StructuralFeature.type', {}),)
+ATTRIBUTE_TYPE[0].append(create_xmi_element('Classifier', {'xmi.idref': 'eaxmiid0'}))  # Placeholder for actual type resolution
+ATTRIBUTE_STYLEEX = (tagged_value('styleex', 'volatile=0;'),)
+
+def create_class_element(class_name, parent_element, element_id_counter, template, description, ids=RANDOM_IDS):
+    """Helper function to create a class element from the template of its package. description must be a string."""
+    class_id = f'EAID_{str(ids.uuid("class", class_name)).replace("-", "_").upper()}'
+    class_element = ET.SubElement(parent_element, f'{UML}Class', {
         'name': class_name,
         'xmi.id': class_id,
         'visibility': 'public',
-        'namespace': package_id,
+        'namespace': template.package_id,
         'isRoot': 'false',
         'isLeaf': 'false',
         'isAbstract': 'false',
         'isActive': 'false'
     })
 
-    class_tagged_values = {
-        'isSpecification': 'false',
-        'ea_stype': 'Class',
-        'ea_ntype': '0',
-        'version': '1.0',
-        'package': package_id,
-        'date_created': datetime.datetime.now(datetime.UTC).strftime('%Y-%m-%d %H:%M:%S'),
-        'date_modified': datetime.datetime.now(datetime.UTC).strftime('%Y-%m-%d %H:%M:%S'),
-        'gentype': 'Java',
-        'tagged': '0',
-        'package_name': model_name,
-        'phase': '1.0',
-        'complexity': '1',
-        'status': 'Proposed',
-        'tpos': '0',
-        'ea_localid': str(next(element_id_counter)),
-        'ea_eleType': 'element',
-        'ea_guid': f'{{{str(uuid.uuid4())}}}',
-        'documentation': description
-    }
-
-    add_tagged_values_to_element(class_element, class_tagged_values)
-    parent_element.append(class_element)
+    tagged_value_container = ET.SubElement(class_element, f'{UML}ModelElement.taggedValue')
+    tagged_value_container.extend(template.elements(template.head))
+    tagged_value_container.append(tagged_value('ea_localid', str(next(element_id_counter))))
+    tagged_value_container.extend(template.elements(template.element_type))
+    tagged_value_container.append(tagged_value('ea_guid', f'{{{str(ids.uuid("class", class_name, "ea_guid"))}}}'))
+    tagged_value_container.append(tagged_value('documentation', description))
     return class_element
 
-def parse_schema(schema, parent_element, element_id_counter, class_id_map, class_element, package_namespace_owned_element, model_name, containing_class=None):
-    """Recursively parse a JSON schema and add to the XML tree."""
+def emit_class(model_class, container, element_id_counter, template, inline_template, class_ids, attribute_guids, ids=RANDOM_IDS):
+    """Add the class element for a model class to container, followed by the classes of its inline composition members.
+
+    The inline classes are created from inline_template. The ids given to the class
+    and its attributes are stored in class_ids and attribute_guids by index.
+    """
+    class_element = create_class_element(model_class.name, container, element_id_counter, template, model_class.description, ids=ids)
+    class_ids[model_class.index] = class_element.get('xmi.id')
+    if model_class.composition_type:
+        add_alias_to_class(class_element, f'{model_class.composition_type} ' + ', '.join(model_class.composition_targets))
     classifier_feature = ET.SubElement(class_element, f'{UML}Classifier.feature')
 
-    for property_name, property_schema in schema.get('properties', {}).items():
-        attribute_id = f'attr_{next(element_id_counter)}'
-        attribute_element = create_xmi_element('Attribute', {
-            'name': property_name,
-            'xmi.id': attribute_id,
+    for attribute in model_class.attributes:
+        attribute_element = ET.Element(f'{UML}Attribute', {
+            'name': attribute.name,
+            'xmi.id': f'attr_{next(element_id_counter)}',
             'visibility': 'private',
             'changeable': 'none',
             'ownerScope': 'instance',
             'targetScope': 'instance'
         })
 
-        if 'example' in property_schema:
-            initial_value = property_schema['example']
-            initial_value_element = create_xmi_element('Attribute.initialValue', {})
-            expression_element = create_xmi_element('Expression', {'body': str(initial_value)})
-            initial_value_element.append(expression_element)
-            attribute_element.append(initial_value_element)
-
-        type_value = property_schema.get('type', 'string')
-        format_value = property_schema.get('format', '')
-
-        if '$ref' in property_schema:
-            ref_class_name = property_schema['$ref'].split('/')[-1]
-            format_value = ref_class_name
-            type_value = 'object'
-
-        if 'oneOf' in property_schema:
-            ref_classes = handle_schema_composition(property_schema['oneOf'], containing_class, parent_element, element_id_counter, class_id_map, package_namespace_owned_element, parent_element.get('namespace'), model_name)
-            format_value = 'oneOf ' + ', '.join(ref_classes)
-            type_value = 'object'
-        elif 'allOf' in property_schema:
-            ref_classes = handle_schema_composition(property_schema['allOf'], containing_class, parent_element, element_id_counter, class_id_map, package_namespace_owned_element, parent_element.get('namespace'), model_name)
-            format_value = 'allOf ' + ', '.join(ref_classes)
-            type_value = 'object'
-        elif 'anyOf' in property_schema:
-            ref_classes = handle_schema_composition(property_schema['anyOf'], containing_class, parent_element, element_id_counter, class_id_map, package_namespace_owned_element, parent_element.get('namespace'), model_name)
-            format_value = 'anyOf ' + ', '.join(ref_classes)
-            type_value = 'object'
-
-        if type_value == 'array' and 'items' in property_schema:
-            item_schema = property_schema['items']
-            if '$ref' in item_schema:
-                ref_class_name = item_schema['$ref'].split('/')[-1]
-                format_value = f'Array of {ref_class_name}'
-            else:
-                item_type = item_schema.get('type', 'string')
-                format_value = f'Array of {item_type}'
-
-        if type_value == 'string' and not format_value and 'maxLength' in property_schema:
-            # Set format as "string(maxLength)"
-            format_value = f"string({property_schema['maxLength']})"
-
-        type_element = create_xmi_element('StructuralFeature.type', {})
-        type_classifier = create_xmi_element('Classifier', {'xmi.idref': 'eaxmiid0'})  # Placeholder for actual type resolution
-        type_element.append(type_classifier)
-        attribute_element.append(type_element)
-
-        attribute_tagged_values = {
-            'type': type_value,
-            'style': format_value,
-            'ea_guid': f'{{{str(uuid.uuid4())}}}',
-            'ea_localid': str(next(element_id_counter)),
-            'styleex': 'volatile=0;',
-            'description': property_schema.get('description', '')
-        }
-        add_tagged_values_to_element(attribute_element, attribute_tagged_values)
+        if attribute.example is not None:
+            initial_value_element = ET.SubElement(attribute_element, f'{UML}Attribute.initialValue')
+            ET.SubElement(initial_value_element, f'{UML}Expression', {'body': attribute.example})
+
+        for inline_class in attribute.inline_classes:
+            emit_class(inline_class, container, element_id_counter, inline_template, inline_template, class_ids, attribute_guids, ids=ids)
+
+        attribute_element.extend(template.elements(ATTRIBUTE_TYPE))
+
+        attribute_guid = str(ids.uuid('attribute', model_class.name, attribute.name))
+        attribute_guids[attribute.index] = attribute_guid
+
+        tagged_value_container = ET.SubElement(attribute_element, f'{UML}ModelElement.taggedValue')
+        tagged_value_container.append(tagged_value('type', attribute.type))
+        tagged_value_container.append(tagged_value('style', attribute.style))
+        tagged_value_container.append(tagged_value('ea_guid', f'{{{attribute_guid}}}'))
+        tagged_value_container.append(tagged_value('ea_localid', str(next(element_id_counter))))
+        tagged_value_container.extend(template.elements(ATTRIBUTE_STYLEEX))
+        tagged_value_container.append(tagged_value('description', attribute.description))
         classifier_feature.append(attribute_element)
+    return class_element
+
+def emit_composition_classes(model_class, container, element_id_counter, template, nested_template, class_ids, attribute_guids, ids=RANDOM_IDS):
+    """Add the classes for the inline members of a class level schema composition to container.
+
+    Classes nested further inside these have always been written without a package,
+    so they are created from nested_template.
+    """
+    for inline_class in model_class.composition_classes:
+        emit_class(inline_class, container, element_id_counter, template, nested_template, class_ids, attribute_guids, ids=ids)
+
+def add_alias_to_class(class_element, alias_value):
+    """Append the alias tagged value describing a class level schema composition."""
+    alias_tagged_value = tagged_value('alias', alias_value)
+    class_tagged_value_container = class_element.find(f'.//{UML}ModelElement.taggedValue')
+    if class_tagged_value_container is None:
+        class_tagged_value_container = ET.SubElement(class_element, f'{UML}ModelElement.taggedValue')
+    class_tagged_value_container.append(alias_tagged_value)
+
+def create_xmi_document(model_name, ea_root_class_name, ids=RANDOM_IDS, package_name=None):
+    """Create the XMI skeleton. Returns the root, the package Namespace.ownedElement and the package id.
 
-def handle_schema_composition(composition_list, containing_class, parent_element, element_id_counter, class_id_map, package_namespace_owned_element, top_level_package_id, model_name):
-    """Handle schema composition (oneOf, allOf, anyOf) and generate inner classes if necessary."""
-    ref_classes = []
-    for ref in composition_list:
-        if '$ref' in ref:
-            ref_classes.append(ref['$ref'].split('/')[-1])
-        elif 'title' in ref:
-            inline_class_name = f"{containing_class}.{ref['title']}" if containing_class else ref['title']
-            ref_classes.append(inline_class_name)
-            inline_class_element = create_class_element(inline_class_name, package_namespace_owned_element, element_id_counter, top_level_package_id, ref.get('description', ''), model_name)
-            class_id_map[inline_class_name] = {'id': inline_class_element.get('xmi.id'), 'element': inline_class_element}
-            parse_schema(ref, parent_element, element_id_counter, class_id_map, inline_class_element, package_namespace_owned_element, model_name, containing_class=inline_class_name)
-    return ref_classes
-
-def json_to_xmi(spec, model_name, ea_root_class_name):
-    """Convert JSON specification to XMI format."""
+    The package is named after the model, unless package_name is given.
+    """
     xmi_root = ET.Element('XMI', {
         'xmi.version': '1.1',
-        'timestamp': datetime.datetime.now(datetime.UTC).strftime('%Y-%m-%d %H:%M:%S')
+        'timestamp': ids.timestamp()
     })
     
     xmi_header = ET.SubElement(xmi_root, 'XMI.header')
@@ -177,7 +202,7 @@ def json_to_xmi(spec, model_name, ea_root_class_name):
     xmi_content = ET.SubElement(xmi_root, 'XMI.content')
     uml_model = create_xmi_element('Model', {
         'name': 'EA Model',
-        'xmi.id': f'MX_{str(uuid.uuid4()).replace("-", "_").upper()}'
+        'xmi.id': f'MX_{str(ids.uuid("model")).replace("-", "_").upper()}'
     })
     xmi_content.append(uml_model)
 
@@ -187,7 +212,7 @@ def json_to_xmi(spec, model_name, ea_root_class_name):
     # Add EARootClass with generated UUID
     ea_root_class = create_xmi_element('Class', {
         'name': ea_root_class_name,
-        'xmi.id': f'EAID_{str(uuid.uuid4()).replace("-", "_").upper()}',
+        'xmi.id': f'EAID_{str(ids.uuid("root_class", ea_root_class_name)).replace("-", "_").upper()}',
         'isRoot': 'true',
         'isLeaf': 'false',
         'isAbstract': 'false'
@@ -196,8 +221,8 @@ def json_to_xmi(spec, model_name, ea_root_class_name):
 
     # Add OpenAPIModel package
     openapi_model_package = create_xmi_element('Package', {
-        'name': model_name,
-        'xmi.id': f'EAPK_{str(uuid.uuid4()).replace("-", "_").upper()}',
+        'name': package_name or model_name,
+        'xmi.id': f'EAPK_{str(ids.uuid("package", package_name) if package_name else ids.uuid("package")).replace("-", "_").upper()}',
         'isRoot': 'false',
         'isLeaf': 'false',
         'isAbstract': 'false',
@@ -205,7 +230,7 @@ def json_to_xmi(spec, model_name, ea_root_class_name):
     })
     model_namespace_owned_element.append(openapi_model_package)
 
-    current_datetime = datetime.datetime.now(datetime.UTC).strftime('%Y-%m-%d %H:%M:%S')
+    current_datetime = ids.timestamp()
     openapi_model_tagged_values = {
         'parent': openapi_model_package.get('xmi.id'),
         'modified': current_datetime,
@@ -222,81 +247,870 @@ def json_to_xmi(spec, model_name, ea_root_class_name):
     package_namespace_owned_element = create_xmi_element('Namespace.ownedElement', {})
     openapi_model_package.append(package_namespace_owned_element)
 
-    class_id_map = {}
+    xmi_root.append(ET.Element('XMI.difference'))
+    xmi_root.append(ET.Element('XMI.extensions', {'xmi.extender': 'Enterprise Architect 2.5'}))
+
+    return xmi_root, package_namespace_owned_element, openapi_model_package.get('xmi.id')
+
+def model_to_xmi(model, model_name, ea_root_class_name, dependencies=False, ids=RANDOM_IDS, shared=False):
+    """Convert a model built by xmi_model.build_model to XMI format. See json_to_xmi.
+
+    Set shared if the tree is only serialized; see ClassTemplate.
+    """
+    xmi_root, package_namespace_owned_element, package_id = create_xmi_document(model_name, ea_root_class_name, ids=ids)
+
     element_id_counter = iter(range(1, 1000000))
+    class_ids = [None] * len(model.classes)
+    attribute_guids = [None] * model.attribute_count
+    timestamp = ids.timestamp()
+    template = ClassTemplate(package_id, model_name, timestamp, shared=shared)
+    unpackaged_template = ClassTemplate(None, model_name, timestamp, shared=shared)
+
+    for model_class in model.schema_classes:
+        emit_class(model_class, package_namespace_owned_element, element_id_counter, template, template, class_ids, attribute_guids, ids=ids)
+
+    # Inline classes from class level schema composition follow all schema classes
+    for model_class in model.schema_classes:
+        emit_composition_classes(model_class, package_namespace_owned_element, element_id_counter, template, unpackaged_template, class_ids, attribute_guids, ids=ids)
+
+    if dependencies:
+        package_namespace_owned_element.extend(resolve_dependencies(model_classes(model, class_ids), model_relations(model, class_ids, attribute_guids), ids=ids, shared=shared))
+
+    return xmi_root
+
+def model_classes(model, class_ids):
+    """Map class names to ids as add_dependencies_to_xmi does; a later class with the same name wins."""
+    return {model_class.name: {'xmi.id': class_ids[model_class.index], 'name': model_class.name} for model_class in model.classes}
+
+def json_to_xmi(spec, model_name, ea_root_class_name, dependencies=False, ids=RANDOM_IDS, dedupe_inline=False):
+    """Convert JSON specification to XMI format.
+
+    If dependencies is set, the dependencies that add_dependencies_to_xmi would add are
+    created directly from the schemas and appended to the package. Pass a
+    DeterministicIds instance as ids for reproducible output. With dedupe_inline,
+    structurally identical inline composition members share a single class.
+    """
+    return model_to_xmi(build_model(spec, dedupe_inline), model_name, ea_root_class_name, dependencies=dependencies, ids=ids)
+
+def model_units(model):
+    """Split the model into the units write_xmi_streaming writes, in document order.
+
+    A unit is a schema class with the inline classes of its attributes, or the inline
+    classes of a class level schema composition, which follow all schema classes.
+    Returns (model_class, composition) pairs.
+    """
+    units = [(model_class, False) for model_class in model.schema_classes]
+    units.extend((model_class, True) for model_class in model.schema_classes if model_class.composition_classes)
+    return units
+
+def unit_classes(model_class, composition):
+    """Return all classes written for a unit."""
+    classes = []
+    pending = list(model_class.composition_classes if composition else [model_class])
+    while pending:
+        unit_class = pending.pop()
+        classes.append(unit_class)
+        for attribute in unit_class.attributes:
+            pending.extend(attribute.inline_classes)
+    return classes
+
+def unit_localids(model_class, composition):
+    """Return the number of local ids used by a unit: one per class and two per attribute."""
+    return sum(1 + 2 * len(unit_class.attributes) for unit_class in unit_classes(model_class, composition))
+
+def unit_id_paths(model_class, composition):
+    """Yield the paths of the uuids generated for a unit."""
+    for unit_class in unit_classes(model_class, composition):
+        yield ('class', unit_class.name)
+        yield ('class', unit_class.name, 'ea_guid')
+        for attribute in unit_class.attributes:
+            yield ('attribute', unit_class.name, attribute.name)
+
+def emit_units(units, first_localid, template, unpackaged_template, ids=RANDOM_IDS):
+    """Convert a run of consecutive units, numbering local ids from first_localid.
+
+    Returns the serialized classes, and the ids given to the classes and attributes
+    as dicts by index. This is the work done by each worker process when
+    write_xmi_streaming is given more than one worker.
+    """
+    element_id_counter = iter(range(first_localid, 1000000))
+    class_ids = {}
+    attribute_guids = {}
+    fragments = []
+    for model_class, composition in units:
+        container = create_xmi_element('Namespace.ownedElement', {})
+        if composition:
+            emit_composition_classes(model_class, container, element_id_counter, template, unpackaged_template, class_ids, attribute_guids, ids=ids)
+        else:
+            emit_class(model_class, container, element_id_counter, template, template, class_ids, attribute_guids, ids=ids)
+        fragments.append(serialize_fragment(container))
+    return ''.join(fragments).encode('utf-8'), class_ids, attribute_guids
+
+def emit_dependencies(relations, ids=RANDOM_IDS):
+    """Create and serialize the dependencies for a run of (relation, supplier_id) pairs."""
+    container = create_xmi_element('Namespace.ownedElement', {})
+    container.extend(create_relation_dependency(relation, supplier_id, ids=ids, shared=True) for relation, supplier_id in relations)
+    return serialize_fragment(container).encode('utf-8')
+
+def split_units(units, run_localids):
+    """Split units into runs of about run_localids local ids. Returns (run, first_localid) pairs."""
+    runs = []
+    run = []
+    run_start = localid = 1
+    for unit in units:
+        run.append(unit)
+        localid += unit_localids(*unit)
+        if localid - run_start >= run_localids:
+            runs.append((run, run_start))
+            run = []
+            run_start = localid
+    if run:
+        runs.append((run, run_start))
+    return runs
+
+XML_DECLARATION = b"<?xml version='1.0' encoding='utf-8'?>\n"
+
+def split_document(xmi_root, package_namespace_owned_element):
+    """Serialize the XMI skeleton once and split it where the classes belong. Returns the encoded head and tail."""
+    marker = ET.SubElement(package_namespace_owned_element, 'XMI.streamMarker')
+    marker_text = ET.tostring(marker, encoding='unicode')
+    document_head, document_tail = ET.tostring(xmi_root, encoding='unicode').split(marker_text)
+    package_namespace_owned_element.remove(marker)
+    return document_head.encode('utf-8'), document_tail.encode('utf-8')
+
+def write_xmi_streaming(spec, model_name, ea_root_class_name, output, dependencies=False, ids=RANDOM_IDS, workers=1, dedupe_inline=False):
+    """Convert JSON specification to XMI, writing each class to the binary stream output as soon as it is complete.
+
+    The result is identical to writing the tree returned by json_to_xmi, but only the
+    classes generated for a single schema are held in memory at any time. Dependencies
+    only need the model, so they are written after the last class.
+
+    With more than one worker, the schemas are converted in that many processes.
+    Every run of schemas is given the local ids and uuid occurrence counts it would
+    have in a serial conversion, and the runs are written in order, so the output is
+    still identical.
+    """
+    xmi_root, package_namespace_owned_element, package_id = create_xmi_document(model_name, ea_root_class_name, ids=ids)
+
+    model = build_model(spec, dedupe_inline)
+    if not model.schema_classes:
+        ET.ElementTree(xmi_root).write(output, encoding='utf-8', xml_declaration=True)
+        return
+
+    document_head, document_tail = split_document(xmi_root, package_namespace_owned_element)
+    output.write(XML_DECLARATION)
+    output.write(document_head)
+
+    class_ids = [None] * len(model.classes)
+    attribute_guids = [None] * model.attribute_count
+    timestamp = ids.timestamp()
+    template = ClassTemplate(package_id, model_name, timestamp, shared=True)
+    unpackaged_template = ClassTemplate(None, model_name, timestamp, shared=True)
+    units = model_units(model)
+
+    def write_run(result):
+        fragment, run_class_ids, run_attribute_guids = result
+        output.write(fragment)
+        for index, class_id in run_class_ids.items():
+            class_ids[index] = class_id
+        for index, attribute_guid in run_attribute_guids.items():
+            attribute_guids[index] = attribute_guid
+
+    if workers > 1:
+        # Several runs per worker even out differences in the time per run
+        runs = split_units(units, max(1, sum(unit_localids(*unit) for unit in units) // (workers * 4)))
+        run_ids = fork_ids(ids, [[path for unit in run for path in unit_id_paths(*unit)] for run, _ in runs])
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for result in executor.map(emit_units, [run for run, _ in runs], [first_localid for _, first_localid in runs], itertools.repeat(template), itertools.repeat(unpackaged_template), run_ids):
+                write_run(result)
+
+            if dependencies:
+                # Dependencies take longer than the classes, so they are split across the workers as well
+                relations = order_relations(model_classes(model, class_ids), model_relations(model, class_ids, attribute_guids))
+                run_size = max(1, len(relations) // (workers * 4))
+                dependency_runs = [relations[start:start + run_size] for start in range(0, len(relations), run_size)]
+                run_ids = fork_ids(ids, [[relation_id_path(*pair) for pair in run] for run in dependency_runs])
+                for fragment in executor.map(emit_dependencies, dependency_runs, run_ids):
+                    output.write(fragment)
+    else:
+        localid = 1
+        for unit in units:
+            write_run(emit_units([unit], localid, template, unpackaged_template, ids=ids))
+            localid += unit_localids(*unit)
+
+        if dependencies:
+            # Created and written a batch at a time, so the dependencies are never all held in memory
+            write_in_batches(iter_dependencies(model_classes(model, class_ids), model_relations(model, class_ids, attribute_guids), ids=ids, shared=True), output)
+
+    output.write(document_tail)
+
+# Delimits the local id placeholders in relocatable units; it cannot occur in XML 1.0 content
+LOCALID_MARKER = '\x01'
+
+def emit_relocatable_unit(unit, template, unpackaged_template, ids=RANDOM_IDS):
+    """Convert a unit with placeholders for its local ids, which change whenever an earlier unit changes size.
+
+    Returns the serialized unit as a list of encoded parts, in which every odd part is
+    the offset of a local id from the first local id of the unit, and the ids given to
+    the classes and attributes as dicts by index. Returns None for the parts if the
+    unit contains the placeholder delimiter itself.
+    """
+    element_id_counter = (f'{LOCALID_MARKER}{offset}{LOCALID_MARKER}' for offset in itertools.count())
+    class_ids = {}
+    attribute_guids = {}
+    container = create_xmi_element('Namespace.ownedElement', {})
+    model_class, composition = unit
+    if composition:
+        emit_composition_classes(model_class, container, element_id_counter, template, unpackaged_template, class_ids, attribute_guids, ids=ids)
+    else:
+        emit_class(model_class, container, element_id_counter, template, template, class_ids, attribute_guids, ids=ids)
+    parts = serialize_fragment(container).split(LOCALID_MARKER)
+    if len(parts) != 2 * unit_localids(*unit) + 1:
+        return None, class_ids, attribute_guids
+    parts[0::2] = [part.encode('utf-8') for part in parts[0::2]]
+    parts[1::2] = [int(part) for part in parts[1::2]]
+    return parts, class_ids, attribute_guids
+
+def place_unit(parts, first_localid):
+    """Fill in the local ids of a unit returned by emit_relocatable_unit."""
+    placed = parts[:]
+    placed[1::2] = [str(first_localid + offset).encode('ascii') for offset in parts[1::2]]
+    return b''.join(placed)
+
+DEPENDENCY_START = '<UML:Dependency '
+
+def unit_key(model_class, composition):
+    """Return a hashable value covering everything written to the XMI for a unit, apart from its ids."""
+    if composition:
+        return True, tuple(class_fingerprint(inline_class) for inline_class in model_class.composition_classes)
+    return False, class_fingerprint(model_class)
+
+class IncrementalConverter:
+    """Convert successive versions of a specification, reusing the XMI of the classes and dependencies that did not change.
+
+    Each unit (see model_units) is cached with its serialized classes, keyed by its
+    content and, with DeterministicIds, the occurrence counts of its paths. The local
+    ids are filled in when the unit is written, so a unit is reused even when an
+    earlier unit has gained or lost attributes. Dependencies are cached in the same way. Only the entries used by the latest
+    version are kept. With DeterministicIds the output is identical to a full conversion;
+    with random ids, unchanged classes and dependencies keep their ids from one version
+    to the next.
+    """
+
+    def __init__(self, model_name, ea_root_class_name, dependencies=False, ids=RANDOM_IDS, dedupe_inline=False):
+        self.dependencies = dependencies
+        self.ids = ids
+        self.dedupe_inline = dedupe_inline
+        xmi_root, package_namespace_owned_element, package_id = create_xmi_document(model_name, ea_root_class_name, ids=ids)
+        output = io.BytesIO()
+        ET.ElementTree(xmi_root).write(output, encoding='utf-8', xml_declaration=True)
+        self.empty_document = output.getvalue()
+        self.document_head, self.document_tail = split_document(xmi_root, package_namespace_owned_element)
+        timestamp = ids.timestamp()
+        self.template = ClassTemplate(package_id, model_name, timestamp, shared=True)
+        self.unpackaged_template = ClassTemplate(None, model_name, timestamp, shared=True)
+        self.unit_cache = {}
+        self.dependency_cache = {}
+
+    def convert(self, spec, output):
+        """Convert a loaded specification and write the XMI to the binary stream output.
+
+        Returns the number of units and dependencies converted, and their totals.
+        """
+        model = build_model(spec, self.dedupe_inline)
+        if not model.schema_classes:
+            output.write(self.empty_document)
+            return {'units': 0, 'converted_units': 0, 'dependencies': 0, 'converted_dependencies': 0}
+        deterministic = isinstance(self.ids, DeterministicIds)
+        # The skeleton was generated once, so the classes count occurrences from scratch
+        ids = self.ids.fork({}) if deterministic else self.ids
+        units = model_units(model)
+        run_ids = fork_ids(ids, [list(unit_id_paths(*unit)) for unit in units])
+
+        output.write(XML_DECLARATION)
+        output.write(self.document_head)
+        class_ids = [None] * len(model.classes)
+        attribute_guids = [None] * model.attribute_count
+        unit_cache = {}
+        localid = 1
+        for unit, unit_ids in zip(units, run_ids):
+            classes = unit_classes(*unit)
+            # Indexes are stored relative to the first class and attribute of the unit, as earlier units may change
+            class_base = min(unit_class.index for unit_class in classes)
+            attribute_base = min((attribute.index for unit_class in classes for attribute in unit_class.attributes), default=0)
+            key = (unit_key(*unit), tuple(sorted(unit_ids.seen.items())) if deterministic else ())
+            entry = self.unit_cache.get(key) or self.unit_cache.get((key, localid))
+            if entry is None:
+                parts, unit_class_ids, unit_attribute_guids = emit_relocatable_unit(unit, self.template, self.unpackaged_template, ids=unit_ids.fork(unit_ids.seen) if deterministic else unit_ids)
+                if parts is None:
+                    # Only reusable at the same local ids
+                    fragment, unit_class_ids, unit_attribute_guids = emit_units([unit], localid, self.template, self.unpackaged_template, ids=unit_ids)
+                    parts = [fragment]
+                    key = (key, localid)
+                entry = (parts, {index - class_base: class_id for index, class_id in unit_class_ids.items()}, {index - attribute_base: guid for index, guid in unit_attribute_guids.items()})
+            elif key not in self.unit_cache:
+                key = (key, localid)
+            unit_cache[key] = entry
+            output.write(place_unit(entry[0], localid))
+            for offset, class_id in entry[1].items():
+                class_ids[class_base + offset] = class_id
+            for offset, attribute_guid in entry[2].items():
+                attribute_guids[attribute_base + offset] = attribute_guid
+            localid += unit_localids(*unit)
+        converted_units = len(unit_cache) - sum(key in self.unit_cache for key in unit_cache)
+        self.unit_cache = unit_cache
 
-    # Parse components.schemas to generate classes
+        dependency_cache = {}
+        if self.dependencies:
+            occurrences = {}
+            fragments = []
+            misses = []
+            for relation, supplier_id in order_relations(model_classes(model, class_ids), model_relations(model, class_ids, attribute_guids)):
+                # Repeated relations are told apart by their occurrence, which also numbers their deterministic ids
+                path = relation_id_path(relation, supplier_id)
+                occurrence = occurrences.get(path, 0)
+                occurrences[path] = occurrence + 1
+                key = (relation, supplier_id, occurrence)
+                fragment = self.dependency_cache.get(key)
+                if fragment is None:
+                    misses.append((len(fragments), key, path))
+                else:
+                    dependency_cache[key] = fragment
+                fragments.append(fragment)
+
+            if misses:
+                # Serialize the new dependencies together and split them, which is much faster than one by one
+                container = create_xmi_element('Namespace.ownedElement', {})
+                container.extend(create_relation_dependency(key[0], key[1], ids=ids.fork({ids.path_key(path): key[2]}) if deterministic else ids, shared=True) for _, key, path in misses)
+                serialized = serialize_fragment(container).split(DEPENDENCY_START)[1:]
+                for (position, key, _), fragment in zip(misses, serialized):
+                    fragment = (DEPENDENCY_START + fragment).encode('utf-8')
+                    dependency_cache[key] = fragments[position] = fragment
+            output.write(b''.join(fragments))
+        converted_dependencies = len(dependency_cache) - sum(key in self.dependency_cache for key in dependency_cache)
+        self.dependency_cache = dependency_cache
+
+        output.write(self.document_tail)
+        return {'units': len(unit_cache), 'converted_units': converted_units, 'dependencies': len(dependency_cache), 'converted_dependencies': converted_dependencies}
+
+SPLIT_MODES = ('prefix', 'component')
+
+# Package for the schemas without relationships to other schemas, when splitting by component
+STANDALONE_PACKAGE = 'Standalone'
+
+def name_prefix(name):
+    """Return the first word of a schema name: the part before a '_', '-' or '.', or the first word of a CamelCase name."""
+    match = re.match(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]*[a-z0-9]*', name)
+    return match.group() or name
+
+def unit_owners(model):
+    """Map the index of every class to the schema class it is written with."""
+    owners = {}
+    for model_class in model.schema_classes:
+        for composition in (False, True):
+            for unit_class in unit_classes(model_class, composition):
+                owners[unit_class.index] = model_class
+    return owners
+
+def split_packages(model, split):
+    """Assign the schema classes to packages. Returns a dict from package name to schema classes, in schema order.
+
+    With 'prefix', schemas are grouped by the first word of their name. With
+    'component', schemas connected by relationships, in either direction, share a
+    package named after the first of them, and schemas without relationships to other
+    schemas share the Standalone package.
+    """
+    if split == 'prefix':
+        keys = {model_class.index: name_prefix(model_class.name) for model_class in model.schema_classes}
+    elif split == 'component':
+        owners = unit_owners(model)
+        classes_by_name = {model_class.name: model_class for model_class in model.classes}
+        parents = {model_class.index: model_class.index for model_class in model.schema_classes}
+
+        def find(index):
+            while parents[index] != index:
+                parents[index] = parents[parents[index]]
+                index = parents[index]
+            return index
+
+        for model_class in model.classes:
+            targets = list(model_class.composition_targets)
+            for attribute in model_class.attributes:
+                targets.extend(attribute.targets)
+            for target in targets:
+                target_class = classes_by_name.get(target)
+                if target_class is not None:
+                    first, second = find(owners[model_class.index].index), find(owners[target_class.index].index)
+                    # The first schema of a component stays its root, so that it names the package
+                    parents[max(first, second)] = min(first, second)
+
+        roots = {model_class.index: find(model_class.index) for model_class in model.schema_classes}
+        sizes = {}
+        for root in roots.values():
+            sizes[root] = sizes.get(root, 0) + 1
+        keys = {index: model.classes[root].name if sizes[root] > 1 else STANDALONE_PACKAGE for index, root in roots.items()}
+    else:
+        raise ValueError(f"Unknown split mode: {split}")
+
+    packages = {}
+    for model_class in model.schema_classes:
+        packages.setdefault(keys[model_class.index], []).append(model_class)
+    return packages
+
+def package_file_name(package):
+    return re.sub(r'[^\w.-]', '_', package) + '.xmi'
+
+def write_xmi_split(spec, model_name, ea_root_class_name, output_dir, split='prefix', dependencies=False, ids=RANDOM_IDS, dedupe_inline=False):
+    """Convert a specification to one XMI file per package, written to output_dir. See split_packages for split.
+
+    Each file contains its own package, named <model_name>_<package>, with the classes
+    of the schemas in the package and their inline classes. Dependencies are written to
+    the file of the class they start from, and may point to a class in another file.
+    The classes, attributes and dependencies have the same ids and local ids as in a
+    single file, so they are unique across the files. The model, the root class and
+    the timestamps are the same in all files.
+
+    Returns a dict from file name to the number of classes, dependencies and
+    dependencies to classes in other files in it.
+    """
+    model = build_model(spec, dedupe_inline)
+    packages = split_packages(model, split)
+
+    # Every unit gets the local ids and uuid occurrence counts it has in a single file, as for parallel conversion
+    units = model_units(model)
+    placements = {}
+    localid = 1
+    for unit, unit_ids in zip(units, fork_ids(ids, [list(unit_id_paths(*unit)) for unit in units])):
+        placements[unit[0].index, unit[1]] = (localid, unit_ids)
+        localid += unit_localids(*unit)
+
+    skeleton_ids = SharedIds(ids)
+    timestamp = skeleton_ids.timestamp()
+    class_ids = [None] * len(model.classes)
+    attribute_guids = [None] * model.attribute_count
+    documents = {}
+    class_packages = {}
+
+    for package, schema_classes in packages.items():
+        package_name = f'{model_name}_{package}'
+        xmi_root, package_namespace_owned_element, package_id = create_xmi_document(model_name, ea_root_class_name, ids=skeleton_ids, package_name=package_name)
+        template = ClassTemplate(package_id, package_name, timestamp, shared=True)
+        unpackaged_template = ClassTemplate(None, package_name, timestamp, shared=True)
+        for model_class in schema_classes:
+            first_localid, unit_ids = placements[model_class.index, False]
+            emit_class(model_class, package_namespace_owned_element, itertools.count(first_localid), template, template, class_ids, attribute_guids, ids=unit_ids)
+        for model_class in schema_classes:
+            if model_class.composition_classes:
+                first_localid, unit_ids = placements[model_class.index, True]
+                emit_composition_classes(model_class, package_namespace_owned_element, itertools.count(first_localid), template, unpackaged_template, class_ids, attribute_guids, ids=unit_ids)
+
+        class_count = 0
+        for model_class in schema_classes:
+            for composition in (False, True):
+                for unit_class in unit_classes(model_class, composition):
+                    class_packages[class_ids[unit_class.index]] = package
+                    class_count += 1
+        documents[package] = (xmi_root, package_namespace_owned_element, {'classes': class_count, 'dependencies': 0, 'cross_file_dependencies': 0})
+
+    if dependencies:
+        for relation, supplier_id in order_relations(model_classes(model, class_ids), model_relations(model, class_ids, attribute_guids)):
+            _, package_namespace_owned_element, counts = documents[class_packages[relation[2]]]
+            package_namespace_owned_element.append(create_relation_dependency(relation, supplier_id, ids=ids, shared=True))
+            counts['dependencies'] += 1
+            if class_packages[supplier_id] != class_packages[relation[2]]:
+                counts['cross_file_dependencies'] += 1
+
+    os.makedirs(output_dir, exist_ok=True)
+    summary = {}
+    for package, (xmi_root, _, counts) in documents.items():
+        file_name = package_file_name(package)
+        suffix = 1
+        while file_name in summary:
+            # Package names that only differ in characters not allowed in file names
+            suffix += 1
+            file_name = package_file_name(f'{package}_{suffix}')
+        ET.ElementTree(xmi_root).write(os.path.join(output_dir, file_name), encoding='utf-8', xml_declaration=True)
+        summary[file_name] = counts
+    return summary
+
+VALIDATION_LEVELS = ('full', 'structural', 'none')
+
+class StructuralValidationError(ValueError):
+    """Raised when the parts of a specification used by json_to_xmi are malformed."""
+
+def check_schema_structure(schema, path, schemas, errors):
+    """Check a schema and the schemas nested in it, appending a message to errors for every problem."""
+    if not isinstance(schema, dict):
+        errors.append(f"{path}: schema must be an object")
+        return
+
+    if '$ref' in schema:
+        ref = schema['$ref']
+        if not isinstance(ref, str):
+            errors.append(f"{path}/$ref: reference must be a string")
+        elif ref.startswith('#/components/schemas/') and ref.split('/')[-1] not in schemas:
+            errors.append(f"{path}/$ref: unresolvable reference {ref}")
+
+    properties = schema.get('properties', {})
+    if not isinstance(properties, dict):
+        errors.append(f"{path}/properties: properties must be an object")
+    else:
+        for property_name, property_schema in properties.items():
+            check_schema_structure(property_schema, f"{path}/properties/{property_name}", schemas, errors)
+
+    if 'items' in schema:
+        check_schema_structure(schema['items'], f"{path}/items", schemas, errors)
+
+    for composition_type in ('oneOf', 'allOf', 'anyOf'):
+        if composition_type in schema:
+            composition_list = schema[composition_type]
+            if not isinstance(composition_list, list):
+                errors.append(f"{path}/{composition_type}: {composition_type} must be an array")
+                continue
+            for index, member in enumerate(composition_list):
+                check_schema_structure(member, f"{path}/{composition_type}/{index}", schemas, errors)
+
+def spec_schemas(spec):
+    """Return the components.schemas of a specification.
+
+    Raises StructuralValidationError if the specification, its components or its
+    schemas are not objects, as nothing can be resolved or converted then.
+    """
+    if not isinstance(spec, dict):
+        raise StructuralValidationError("specification must be an object")
     components = spec.get('components', {})
-    schemas = components.get('schemas', {})
-    for schema_name, schema in schemas.items():
-        class_element = create_class_element(schema_name, package_namespace_owned_element, element_id_counter, openapi_model_package.get('xmi.id'), schema.get('description', ''), model_name)
-        class_id_map[schema_name] = {'id': class_element.get('xmi.id'), 'element': class_element}
-        parse_schema(schema, class_element, element_id_counter, class_id_map, class_element, package_namespace_owned_element, model_name, containing_class=schema_name)
+    schemas = components.get('schemas', {}) if isinstance(components, dict) else None
+    if not isinstance(schemas, dict):
+        raise StructuralValidationError("#/components/schemas: schemas must be an object")
+    return schemas
 
-    # Handle dependencies for schema composition
+def validate_structure(spec):
+    """Lightweight check of only the parts of the specification that json_to_xmi reads.
+
+    This covers components.schemas, properties, items, $ref and the composition
+    keywords, and is much faster than full validation on large specifications.
+    """
+    errors = []
+    schemas = spec_schemas(spec)
     for schema_name, schema in schemas.items():
-        class_info = class_id_map.get(schema_name)
-        if class_info:
-            if 'oneOf' in schema or 'allOf' in schema or 'anyOf' in schema:
-                ref_classes = []
-                composition_type = ''
-                if 'oneOf' in schema:
-                    ref_classes = handle_schema_composition(schema['oneOf'], schema_name, package_namespace_owned_element, element_id_counter, class_id_map, package_namespace_owned_element, openapi_model_package.get('xmi.id'), model_name)
-                    composition_type = 'oneOf'
-                elif 'allOf' in schema:
-                    ref_classes = handle_schema_composition(schema['allOf'], schema_name, package_namespace_owned_element, element_id_counter, class_id_map, package_namespace_owned_element, openapi_model_package.get('xmi.id'), model_name)
-                    composition_type = 'allOf'
-                elif 'anyOf' in schema:
-                    ref_classes = handle_schema_composition(schema['anyOf'], schema_name, package_namespace_owned_element, element_id_counter, class_id_map, package_namespace_owned_element, openapi_model_package.get('xmi.id'), model_name)
-                    composition_type = 'anyOf'
-                
-                alias_value = f'{composition_type} ' + ', '.join(ref_classes)
-                alias_tagged_value = create_tagged_value('TaggedValue', {'tag': 'alias', 'value': alias_value})
-                class_tagged_value_container = class_info['element'].find(f'.//{UML}ModelElement.taggedValue')
-                if class_tagged_value_container is None:
-                    class_tagged_value_container = ET.SubElement(class_info['element'], f'{UML}ModelElement.taggedValue')
-                class_tagged_value_container.append(alias_tagged_value)
+        check_schema_structure(schema, f"#/components/schemas/{schema_name}", schemas, errors)
+    if errors:
+        raise StructuralValidationError('\n'.join(errors))
 
-    xmi_root.append(ET.Element('XMI.difference'))
-    xmi_root.append(ET.Element('XMI.extensions', {'xmi.extender': 'Enterprise Architect 2.5'}))
+def validate(spec, level='full', base_uri=''):
+    """Validate a specification. level is one of VALIDATION_LEVELS: 'full' runs the OpenAPI
+    validator, 'structural' runs validate_structure and 'none' skips validation. base_uri
+    is the URI the references to other documents are resolved against in full validation."""
+    if level == 'full':
+        try:
+            # Not validate_spec, which ignores base_uri, so references to other documents could not be followed
+            validate_openapi(spec, base_uri=base_uri)
+        except Unresolvable as e:
+            raise StructuralValidationError(f"unresolvable reference {e.ref}")
+        except ValidatorDetectError:
+            raise StructuralValidationError("unknown OpenAPI version: the specification needs an openapi or swagger key")
+        except OpenAPISpecValidatorError as e:
+            raise StructuralValidationError(str(e) or type(e).__name__)
+    elif level == 'structural':
+        validate_structure(spec)
+    elif level != 'none':
+        raise ValueError(f"Unknown validation level: {level}")
 
-    return xmi_root
+def parse_json(data):
+    """Parse JSON from bytes, with orjson if it is available."""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson is stricter than json (e.g. integers above 64 bits), so let json decide
+            pass
+    return json.loads(data)
+
+def parse_yaml(data):
+    """Parse YAML from bytes, with libyaml if it is available."""
+    return yaml.load(data, Loader=YAMLLoader)
+
+def parse_spec(data):
+    """Parse a JSON or YAML specification from bytes; JSON is recognised by its opening brace."""
+    return parse_json(data) if data.lstrip().startswith(b'{') else parse_yaml(data)
+
+def load_spec(input_file):
+    """Load a JSON or YAML specification from a file, or from stdin if input_file is '-'.
+
+    Files are read as bytes rather than through a text stream, so the parsers work
+    directly on the file contents. They are not memory mapped: a file that is saved
+    again while it is being parsed would crash the process when it shrinks.
+    """
+    if input_file == '-':
+        return parse_spec(sys.stdin.buffer.read())
+    with open(input_file, 'rb') as f:
+        data = f.read()
+    if input_file.endswith('.yaml') or input_file.endswith('.yml'):
+        return parse_yaml(data)
+    return parse_json(data)
+
+def load_document(path):
+    """Load a document referenced from a specification, naming it in parse errors."""
+    try:
+        return load_spec(path)
+    except (yaml.YAMLError, json.JSONDecodeError) as e:
+        raise UnresolvableReferenceError(f"cannot parse {path}: {e}")
+
+# Documents referenced by the specifications converted in this process
+DOCUMENT_CACHE = DocumentCache(load_document)
+
+def resolve_spec(spec, input_file):
+    """Add the schemas the specification references in other documents to its components.schemas.
+
+    Relative references are resolved against the directory of input_file, or the current
+    directory for stdin ('-'). Raises StructuralValidationError, whatever the validation
+    level, if the specification or its schemas are not objects (see spec_schemas).
+    """
+    spec_schemas(spec)
+    return resolve_external_refs(spec, None if input_file == '-' else input_file, DOCUMENT_CACHE)
+
+def spec_uri(input_file):
+    """Return the base URI for validating the specification loaded from input_file, as for resolve_spec."""
+    if input_file == '-':
+        return pathlib.Path(os.getcwd()).as_uri() + '/'
+    return pathlib.Path(os.path.abspath(input_file)).as_uri()
+
+def write_xmi(spec, model_name, ea_root_class_name, output_file, stream=False, dependencies=False, ids=RANDOM_IDS, workers=1, dedupe_inline=False):
+    """Convert a loaded specification and write the XMI to output_file, or to stdout if output_file is '-'."""
+    if output_file == '-':
+        write_xmi_to_stream(spec, model_name, ea_root_class_name, sys.stdout.buffer, stream=stream, dependencies=dependencies, ids=ids, workers=workers, dedupe_inline=dedupe_inline)
+    else:
+        with open(output_file, 'wb') as output:
+            write_xmi_to_stream(spec, model_name, ea_root_class_name, output, stream=stream, dependencies=dependencies, ids=ids, workers=workers, dedupe_inline=dedupe_inline)
+
+def write_xmi_to_stream(spec, model_name, ea_root_class_name, output, stream=False, dependencies=False, ids=RANDOM_IDS, workers=1, dedupe_inline=False):
+    """Convert a loaded specification and write the XMI to the binary stream output.
+
+    Converting with more than one worker always streams the output.
+    """
+    if stream or workers > 1:
+        write_xmi_streaming(spec, model_name, ea_root_class_name, output, dependencies=dependencies, ids=ids, workers=workers, dedupe_inline=dedupe_inline)
+    else:
+        # The tree is only written, so the classes can share the template elements
+        xmi_tree = ET.ElementTree(model_to_xmi(build_model(spec, dedupe_inline), model_name, ea_root_class_name, dependencies=dependencies, ids=ids, shared=True))
+        xmi_tree.write(output, encoding='utf-8', xml_declaration=True)
+
+def file_version(path):
+    """Return what identifies the current version of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+def watch(args, model_name, ea_root_class_name, log=sys.stdout):
+    """Convert the input file again whenever it or a file it references changes, until interrupted.
+
+    The files are polled every args.poll_interval seconds. Only the classes and
+    dependencies of changed schemas are converted again, by an IncrementalConverter.
+    The output file is replaced in one step, so it is never seen half written. Errors,
+    including unexpected ones, are reported and watching goes on.
+    """
+    input_file = args.input_file
+    ids = DeterministicIds(model_name, args.timestamp) if args.deterministic else RANDOM_IDS
+    converter = IncrementalConverter(model_name, ea_root_class_name, dependencies=args.dependencies, ids=ids, dedupe_inline=args.dedupe_inline_classes)
+    watched = {input_file: None}
+    print(f"Watching {input_file} for changes, press Ctrl+C to stop", file=log, flush=True)
+    try:
+        while True:
+            # Versions are taken before loading, so that a save during the conversion triggers another one
+            versions = {path: file_version(path) for path in watched}
+            if versions != watched and versions[input_file] is not None:
+                documents = convert_watched(converter, args, log)
+                watched = {path: versions[path] if path in versions else file_version(path) for path in [input_file, *documents]}
+            time.sleep(args.poll_interval)
+    except KeyboardInterrupt:
+        pass
+
+def convert_watched(converter, args, log):
+    """Convert the input file once for watch. Returns the paths of the documents it references."""
+    input_file = args.input_file
+    output_file = args.output_file
+    start = time.perf_counter()
+    resolver = None
+    try:
+        spec = load_spec(input_file)
+        spec_schemas(spec)
+        resolver = ExternalRefResolver(spec, input_file, DOCUMENT_CACHE)
+        spec = resolver.resolve()
+        validate(spec, args.validation, spec_uri(input_file))
+    except (yaml.YAMLError, json.JSONDecodeError, OSError) as e:
+        print(f"Error reading input file: {e}", file=log, flush=True)
+    except UnresolvableReferenceError as e:
+        print(f"Error resolving reference: {e}", file=log, flush=True)
+    except (OpenAPIValidationError, StructuralValidationError) as e:
+        print(f"OpenAPI specification validation error: {e}", file=log, flush=True)
+    except Exception as e:
+        # A half edited file can break in ways validation does not cover, especially with --validation none
+        print(f"Error converting {input_file}: {type(e).__name__}: {e}", file=log, flush=True)
+    else:
+        try:
+            fd, temporary_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_file)), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as output:
+                    counts = converter.convert(spec, output)
+                os.replace(temporary_file, output_file)
+            except BaseException:
+                os.remove(temporary_file)
+                raise
+        except IOError as e:
+            print(f"Error writing output file: {e}", file=log, flush=True)
+        except Exception as e:
+            print(f"Error converting {input_file}: {type(e).__name__}: {e}", file=log, flush=True)
+        else:
+            summary = f"{counts['converted_units']} of {counts['units']} schema units"
+            if args.dependencies:
+                summary += f" and {counts['converted_dependencies']} of {counts['dependencies']} dependencies"
+            print(f"XMI file written to {output_file} in {(time.perf_counter() - start) * 1000:.0f} ms ({summary} converted)", file=log, flush=True)
+    return list(resolver.indexes) if resolver else []
+
+def instrument_conversion(stats):
+    """Wrap the conversion functions for a statistics report: the passes are timed as phases,
+    and the classes, attributes, tagged values and dependencies created are counted."""
+    import add_dependencies_to_xmi
+    module = sys.modules[__name__]
+
+    def count_class(counts, args, class_element):
+        counts['classes'] += 1
+        counts['attributes'] += len(args[0].attributes)
+        counts['tagged_values'] += sum(1 for _ in class_element.iter(f'{UML}TaggedValue'))
+
+    def count_dependency(counts, args, dependency):
+        counts['dependencies'] += 1
+        counts['tagged_values'] += len(dependency.find(f'{UML}ModelElement.taggedValue'))
+
+    for function_name in ('build_model', 'model_to_xmi', 'write_xmi_streaming', 'resolve_dependencies'):
+        stats.instrument(module, function_name)
+    # Called once per class and dependency, too often to be timed without slowing down the passes they are part of
+    stats.instrument(module, 'emit_class', phase=False, count=count_class)
+    stats.instrument(add_dependencies_to_xmi, 'create_dependency_element', phase=False, count=count_dependency)
 
 def main():
-    if len(sys.argv) < 3:
-        print("Usage: python convert_json_to_xmi.py <input_file> <output_file>")
+    parser = argparse.ArgumentParser(description='Convert an OpenAPI specification to Sparx XMI.')
+    parser.add_argument('input_file', help="input specification, or '-' to read from stdin")
+    parser.add_argument('output_file', help="output XMI file, or '-' to write to stdout")
+    parser.add_argument('--stream', action='store_true', help='write each class as soon as it is converted instead of building the whole tree in memory')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='convert the schemas in this many processes; the output is streamed and identical to a serial conversion (default: %(default)s)')
+    parser.add_argument('--dependencies', action='store_true', help='also add the dependencies between classes, as add_dependencies_to_xmi.py does')
+    parser.add_argument('--dedupe-inline-classes', action='store_true', help='create a single class for structurally identical inline oneOf/allOf/anyOf members, named after the first of them')
+    parser.add_argument('--name', help='name used for the model and root class (defaults to the input file name)')
+    parser.add_argument('--validation', choices=VALIDATION_LEVELS, default='full', help="'full' validates the whole specification, 'structural' only checks the parts used for the conversion, 'none' skips validation (default: %(default)s)")
+    parser.add_argument('--deterministic', action='store_true', help='derive ids from the model, class and attribute names and use a fixed timestamp, so repeated runs give identical output')
+    parser.add_argument('--timestamp', help="timestamp used with --deterministic, as 'YYYY-MM-DD HH:MM:SS' (defaults to SOURCE_DATE_EPOCH or 1970-01-01 00:00:00)")
+    parser.add_argument('--cache-dir', help='reuse the XMI generated for an unchanged specification from this directory, skipping validation and conversion')
+    parser.add_argument('--cache-max-size', type=int, default=DEFAULT_CACHE_MAX_SIZE // (1024 * 1024), help='maximum size of the cache in MB (default: %(default)s)')
+    parser.add_argument('--refresh-cache', action='store_true', help='ignore any cached XMI for this specification and regenerate it')
+    parser.add_argument('--split', choices=SPLIT_MODES, help="write one XMI file per package to the directory given as output file, grouping the schemas by the first word of their name ('prefix') or by connected relationships ('component')")
+    parser.add_argument('--watch', action='store_true', help='keep running and convert again whenever the input file or a file it references is saved, reusing the XMI of unchanged schemas')
+    parser.add_argument('--poll-interval', type=float, default=0.2, help='seconds between checks for changes with --watch (default: %(default)s)')
+    parser.add_argument('--stats', metavar='REPORT_FILE', help="write a JSON report with the time per phase and the number of elements created ('-' for stderr)")
+    parser.add_argument('--trace-memory', action='store_true', help='also report the peak memory per phase in the --stats report; this slows the run down several times')
+    parser.add_argument('--profile', metavar='PROFILE_FILE', help='write a cProfile profile of the run, for use with pstats or snakeviz')
+    args = parser.parse_args()
+
+    if args.stats and args.workers > 1:
+        # The classes and dependencies are created in the worker processes, where they cannot be counted
+        print("--stats cannot be combined with --workers, as the elements are created in other processes", file=sys.stderr if args.output_file == '-' else sys.stdout)
         sys.exit(1)
+    if args.trace_memory and not args.stats:
+        print("--trace-memory requires --stats", file=sys.stderr if args.output_file == '-' else sys.stdout)
+        sys.exit(1)
+
+    with profiling(args.stats, args.profile, instrument=instrument_conversion, trace_memory=args.trace_memory) as phase:
+        run(args, phase)
 
-    input_file = sys.argv[1]
-    output_file = sys.argv[2]
+def run(args, phase=null_phase):
+    """Run the conversion for the parsed command line arguments."""
+    input_file = args.input_file
+    output_file = args.output_file
+    # Keep stdout clean when the XMI is written to it
+    log = sys.stderr if output_file == '-' else sys.stdout
 
     # Extract filename without extension for dynamic naming
-    base_name = os.path.splitext(os.path.basename(input_file))[0]
+    base_name = args.name or ('stdin' if input_file == '-' else os.path.splitext(os.path.basename(input_file))[0])
     model_name = f"OAS_{base_name}"
     ea_root_class_name = f"EARootClass_{base_name}"
 
+    if args.split and (output_file == '-' or args.watch or args.stream or args.workers > 1):
+        print("--split writes a directory of files, and cannot be combined with stdout, --watch, --stream or --workers", file=log)
+        sys.exit(1)
+
+    if args.watch:
+        if input_file == '-' or output_file == '-':
+            print("Watching needs an input file and an output file, not stdin or stdout", file=log)
+            sys.exit(1)
+        watch(args, model_name, ea_root_class_name, log=log)
+        return
+
+    timings = {}
+    start = time.perf_counter()
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            if input_file.endswith('.yaml') or input_file.endswith('.yml'):
-                spec = yaml.safe_load(f)
-            else:
-                spec = json.load(f)
-        validate_spec(spec)
-        print("OpenAPI specification is valid.")
+        with phase('load'):
+            spec = load_spec(input_file)
+        with phase('resolve'):
+            spec = resolve_spec(spec, input_file)
     except (yaml.YAMLError, json.JSONDecodeError, FileNotFoundError) as e:
-        print(f"Error reading input file: {e}")
+        print(f"Error reading input file: {e}", file=log)
+        sys.exit(1)
+    except UnresolvableReferenceError as e:
+        print(f"Error resolving reference: {e}", file=log)
         sys.exit(1)
-    except OpenAPIValidationError as e:
-        print(f"OpenAPI specification validation error: {e}")
+    except StructuralValidationError as e:
+        print(f"OpenAPI specification validation error: {e}", file=log)
+        sys.exit(1)
+    timings['load'] = time.perf_counter() - start
+
+    ids = DeterministicIds(model_name, args.timestamp) if args.deterministic else RANDOM_IDS
+    # The cache only applies to single output files, as its entries are copies of them
+    key = None
+    if args.cache_dir and output_file != '-' and not args.split:
+        with phase('cache'):
+            # A cached file skips validation, so it is only reused at the validation level it was created with.
+            # The timestamp is the one written, which may come from SOURCE_DATE_EPOCH
+            key = cache_key(spec, {'model_name': model_name, 'ea_root_class_name': ea_root_class_name, 'validation': args.validation, 'dependencies': args.dependencies, 'deterministic': args.deterministic, 'timestamp': ids.timestamp() if args.deterministic else None, 'dedupe_inline': args.dedupe_inline_classes})
+            restored = not args.refresh_cache and restore_from_cache(args.cache_dir, key, output_file)
+        if restored:
+            print(f"Specification unchanged, XMI file restored from cache to {output_file}", file=log)
+            return
+
+    start = time.perf_counter()
+    try:
+        with phase('validate'):
+            validate(spec, args.validation, spec_uri(input_file))
+        if args.validation == 'full':
+            print("OpenAPI specification is valid.", file=log)
+        elif args.validation == 'structural':
+            print("OpenAPI specification passed structural checks.", file=log)
+    except (OpenAPIValidationError, StructuralValidationError) as e:
+        print(f"OpenAPI specification validation error: {e}", file=log)
         sys.exit(1)
+    timings['validate'] = time.perf_counter() - start
 
-    xmi_tree = ET.ElementTree(json_to_xmi(spec, model_name, ea_root_class_name))
+    start = time.perf_counter()
     try:
-        xmi_tree.write(output_file, encoding='utf-8', xml_declaration=True)
-        print(f"XMI file written to {output_file}")
+        if args.split:
+            with phase('write'):
+                summary = write_xmi_split(spec, model_name, ea_root_class_name, output_file, split=args.split, dependencies=args.dependencies, ids=ids, dedupe_inline=args.dedupe_inline_classes)
+            for file_name, counts in summary.items():
+                print(f"  {file_name}: {counts['classes']} classes, {counts['dependencies']} dependencies ({counts['cross_file_dependencies']} to classes in other files)", file=log)
+            print(f"{len(summary)} XMI files written to {output_file}", file=log)
+        else:
+            with phase('write'):
+                write_xmi(spec, model_name, ea_root_class_name, output_file, stream=args.stream, dependencies=args.dependencies, ids=ids, workers=args.workers, dedupe_inline=args.dedupe_inline_classes)
+            if key:
+                with phase('cache'):
+                    store_in_cache(args.cache_dir, key, output_file, args.cache_max_size * 1024 * 1024)
+            print(f"XMI file written to {output_file}", file=log)
     except IOError as e:
-        print(f"Error writing output file: {e}")
+        print(f"Error writing output file: {e}", file=log)
         sys.exit(1)
+    timings['convert'] = time.perf_counter() - start
+    print("Timings: " + ', '.join(f"{name} {seconds:.3f}s" for name, seconds in timings.items()), file=log)
 
 if __name__ == "__main__":
     main()
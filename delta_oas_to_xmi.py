@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+import sys
+import xml.etree.ElementTree as ET
+import yaml
+from convert_oas_to_xmi import UML, VALIDATION_LEVELS, json_to_xmi, load_spec, resolve_spec, spec_uri, validate, OpenAPIValidationError, StructuralValidationError, UnresolvableReferenceError
+from xmi_ids import DeterministicIds
+from xmi_model import build_model, class_fingerprint
+
+def schema_fingerprints(spec, dedupe_inline=False):
+    """Map every schema name to a fingerprint of the classes written for the schema.
+
+    The fingerprint covers the class and the inline classes created for it, so a schema
+    also counts as changed when only its classes change, such as when an inline member
+    starts or stops sharing the class of another schema with dedupe_inline.
+    """
+    model = build_model(spec, dedupe_inline)
+    return {model_class.name: (class_fingerprint(model_class), tuple(class_fingerprint(inline_class) for inline_class in model_class.composition_classes))
+            for model_class in model.schema_classes}
+
+def diff_schemas(old_schemas, new_schemas):
+    """Return the names of the added, changed and removed schemas, given their fingerprints."""
+    added = [name for name in new_schemas if name not in old_schemas]
+    changed = [name for name in new_schemas if name in old_schemas and new_schemas[name] != old_schemas[name]]
+    removed = [name for name in old_schemas if name not in new_schemas]
+    return added, changed, removed
+
+def owning_schema(class_name, schema_names):
+    """Return the schema a class was generated from.
+
+    Inline classes are named after their containing class ("Schema.Title"), so the
+    owner is the longest schema name that is the class name or a prefix of it.
+    """
+    candidate = class_name
+    while candidate not in schema_names:
+        if '.' not in candidate:
+            return None
+        candidate = candidate.rsplit('.', 1)[0]
+    return candidate
+
+def json_to_delta_xmi(old_spec, spec, model_name, ea_root_class_name, ids, dedupe_inline=False):
+    """Convert the schemas that were added or changed between old_spec and spec to XMI.
+
+    The delta contains the classes generated from those schemas, including their inline
+    classes, and the dependencies that start from them. ids must be a DeterministicIds
+    instance, so that the ids of the model, package and any referenced classes match a
+    full conversion of spec with the same dedupe_inline. Returns the XMI root and the
+    added, changed and removed schema names.
+    """
+    schemas = schema_fingerprints(spec, dedupe_inline)
+    added, changed, removed = diff_schemas(schema_fingerprints(old_spec, dedupe_inline), schemas)
+    touched = set(added) | set(changed)
+
+    # Convert the full model so that ids match, then keep only what was touched
+    xmi_root = json_to_xmi(spec, model_name, ea_root_class_name, dependencies=True, ids=ids, dedupe_inline=dedupe_inline)
+    package_namespace_owned_element = xmi_root.find(f'.//{UML}Package/{UML}Namespace.ownedElement')
+
+    kept_class_ids = set()
+    for element in list(package_namespace_owned_element):
+        if element.tag == f'{UML}Class':
+            if owning_schema(element.get('name'), schemas) in touched:
+                kept_class_ids.add(element.get('xmi.id'))
+            else:
+                package_namespace_owned_element.remove(element)
+    for element in list(package_namespace_owned_element):
+        if element.tag == f'{UML}Dependency' and element.get('client') not in kept_class_ids:
+            package_namespace_owned_element.remove(element)
+
+    return xmi_root, added, changed, removed
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert only the schemas that changed between two versions of an OpenAPI specification to Sparx XMI.')
+    parser.add_argument('old_file', help='previous version of the specification')
+    parser.add_argument('new_file', help='new version of the specification')
+    parser.add_argument('output_file', help='output XMI file')
+    parser.add_argument('--name', help='name used for the model and root class (defaults to the new file name)')
+    parser.add_argument('--dedupe-inline-classes', action='store_true', help='create a single class for structurally identical inline composition members; use the same setting as for the model to update')
+    parser.add_argument('--validation', choices=VALIDATION_LEVELS, default='full', help='validation level for the new specification, as for convert_oas_to_xmi.py (default: %(default)s)')
+    parser.add_argument('--timestamp', help="timestamp used for the model, as 'YYYY-MM-DD HH:MM:SS'")
+    args = parser.parse_args()
+
+    base_name = args.name or os.path.splitext(os.path.basename(args.new_file))[0]
+    model_name = f"OAS_{base_name}"
+    ea_root_class_name = f"EARootClass_{base_name}"
+
+    try:
+        old_spec = resolve_spec(load_spec(args.old_file), args.old_file)
+        spec = resolve_spec(load_spec(args.new_file), args.new_file)
+        validate(spec, args.validation, spec_uri(args.new_file))
+        if args.validation == 'full':
+            print("OpenAPI specification is valid.")
+        elif args.validation == 'structural':
+            print("OpenAPI specification passed structural checks.")
+    except (yaml.YAMLError, json.JSONDecodeError, FileNotFoundError) as e:
+        print(f"Error reading input file: {e}")
+        sys.exit(1)
+    except UnresolvableReferenceError as e:
+        print(f"Error resolving reference: {e}")
+        sys.exit(1)
+    except (OpenAPIValidationError, StructuralValidationError) as e:
+        print(f"OpenAPI specification validation error: {e}")
+        sys.exit(1)
+
+    xmi_root, added, changed, removed = json_to_delta_xmi(old_spec, spec, model_name, ea_root_class_name, DeterministicIds(model_name, args.timestamp), args.dedupe_inline_classes)
+    print(f"Added schemas: {', '.join(added) or 'none'}")
+    print(f"Changed schemas: {', '.join(changed) or 'none'}")
+    if removed:
+        # XMI import cannot delete elements, so removed classes have to be deleted in EA
+        print(f"Removed schemas (delete these classes in EA): {', '.join(removed)}")
+
+    try:
+        ET.ElementTree(xmi_root).write(args.output_file, encoding='utf-8', xml_declaration=True)
+        print(f"XMI file written to {args.output_file}")
+    except IOError as e:
+        print(f"Error writing output file: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
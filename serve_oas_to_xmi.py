@@ -0,0 +1,142 @@
+import argparse
+import os
+import socketserver
+import sys
+import traceback
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlsplit
+from convert_oas_to_xmi import VALIDATION_LEVELS
+from xmi_api import ConversionError, add_dependencies_to_bytes, convert, convert_file
+
+DEFAULT_PORT = 8765
+
+# Query parameters of /convert that are flags, as the command line options of convert_oas_to_xmi.py
+FLAG_OPTIONS = ('dependencies', 'deterministic', 'dedupe_inline', 'stream')
+
+def flag(query, name):
+    return query.get(name, [''])[-1].lower() in ('1', 'true', 'yes', 'on')
+
+def convert_options(query):
+    """Return the keyword arguments for xmi_api.convert from the query parameters of a request."""
+    options = {name: flag(query, name) for name in FLAG_OPTIONS}
+    validation = query.get('validation', ['full'])[-1]
+    if validation not in VALIDATION_LEVELS:
+        raise ConversionError(f"Unknown validation level: {validation}")
+    options['validation'] = validation
+    if 'timestamp' in query:
+        options['timestamp'] = query['timestamp'][-1]
+    if 'workers' in query:
+        try:
+            options['workers'] = max(1, int(query['workers'][-1]))
+        except ValueError:
+            raise ConversionError(f"Invalid number of workers: {query['workers'][-1]}")
+    return options
+
+class ConversionHandler(BaseHTTPRequestHandler):
+    """Handle conversion jobs.
+
+    POST /convert converts the specification in the request body, or the file given
+    by the path parameter when the body is empty. POST /add-dependencies adds the
+    dependencies to the XMI in the request body. Options are passed as query
+    parameters. The XMI is returned with status 200; problems with the input are
+    returned as text with status 400.
+    """
+    server_version = 'OpenAPISparxTransform'
+
+    def do_GET(self):
+        if urlsplit(self.path).path == '/health':
+            self.send_text(200, 'ok\n')
+        else:
+            self.send_text(404, 'Not found\n')
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        try:
+            if url.path == '/convert':
+                options = convert_options(query)
+                name = query.get('name', [None])[-1]
+                spec_path = query.get('path', [None])[-1]
+                if body:
+                    xmi = convert(body, name=name or (os.path.splitext(os.path.basename(spec_path))[0] if spec_path else 'spec'), spec_path=spec_path, **options)
+                elif spec_path:
+                    xmi = convert_file(spec_path, name=name, **options)
+                else:
+                    raise ConversionError("No specification given: send it as the request body or pass its path")
+            elif url.path == '/add-dependencies':
+                xmi = add_dependencies_to_bytes(body, deterministic=flag(query, 'deterministic'))
+            else:
+                self.send_text(404, 'Not found\n')
+                return
+        except ConversionError as e:
+            self.send_text(400, f'{e}\n')
+            return
+        except Exception:
+            # Keep serving after unexpected errors, but report them in full
+            self.send_text(500, traceback.format_exc())
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(xmi)))
+        self.end_headers()
+        self.wfile.write(xmi)
+
+    def send_text(self, status, text):
+        data = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'local'
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+class ConversionServer(HTTPServer):
+    """Serve conversion jobs on a TCP port. Jobs are handled one at a time, so the caches need no locking."""
+    quiet = False
+
+class UnixConversionServer(socketserver.UnixStreamServer):
+    """Serve conversion jobs on a Unix socket."""
+    quiet = False
+
+def main():
+    parser = argparse.ArgumentParser(description='Keep the converter loaded and serve conversion jobs over HTTP, so that each conversion does not pay for starting Python.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='port to listen on (default: %(default)s)')
+    parser.add_argument('--socket', metavar='PATH', help='listen on this Unix socket instead of a TCP port')
+    parser.add_argument('--quiet', action='store_true', help='do not log requests')
+    args = parser.parse_args()
+
+    try:
+        if args.socket:
+            if os.path.exists(args.socket):
+                os.unlink(args.socket)
+            server = UnixConversionServer(args.socket, ConversionHandler)
+            address = args.socket
+        else:
+            server = ConversionServer((args.host, args.port), ConversionHandler)
+            address = f"http://{args.host}:{server.server_address[1]}"
+    except OSError as e:
+        print(f"Error starting server: {e}")
+        sys.exit(1)
+    server.quiet = args.quiet
+
+    print(f"Serving conversions on {address}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket:
+            os.unlink(args.socket)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import io
+import json
+import os
+import xml.etree.ElementTree as ET
+import yaml
+from convert_oas_to_xmi import OpenAPIValidationError, StructuralValidationError, UnresolvableReferenceError, load_spec, parse_spec, resolve_spec, spec_uri, validate, write_xmi_to_stream
+from add_dependencies_to_xmi import UML, add_dependencies_to_root
+from xmi_ids import RANDOM_IDS, DeterministicIds
+
+class ConversionError(ValueError):
+    """A specification or XMI document could not be converted. The message is the one the scripts print."""
+
+def convert(spec, name='spec', spec_path=None, dependencies=False, validation='full', deterministic=False, timestamp=None, dedupe_inline=False, stream=False, workers=1):
+    """Convert a specification to XMI and return the XMI file contents.
+
+    spec is a loaded specification, or the bytes of a JSON or YAML specification.
+    name is used for the model and root class, as --name is by convert_oas_to_xmi.py.
+    spec_path is the file the specification came from: references to other files are
+    resolved relative to it, or to the current directory if it is None. The other
+    options are those of convert_oas_to_xmi.py. The output is identical to the file
+    the script writes.
+
+    Nothing is printed and the process is never exited; any problem with the
+    specification raises ConversionError.
+    """
+    input_file = spec_path or '-'
+    try:
+        if isinstance(spec, (bytes, bytearray)):
+            spec = parse_spec(spec)
+        spec = resolve_spec(spec, input_file)
+    except (yaml.YAMLError, json.JSONDecodeError) as e:
+        raise ConversionError(f"Error reading input file: {e}") from e
+    except UnresolvableReferenceError as e:
+        raise ConversionError(f"Error resolving reference: {e}") from e
+    except StructuralValidationError as e:
+        raise ConversionError(f"OpenAPI specification validation error: {e}") from e
+
+    try:
+        validate(spec, validation, spec_uri(input_file))
+    except (OpenAPIValidationError, StructuralValidationError) as e:
+        raise ConversionError(f"OpenAPI specification validation error: {e}") from e
+
+    model_name = f"OAS_{name}"
+    ea_root_class_name = f"EARootClass_{name}"
+    ids = DeterministicIds(model_name, timestamp) if deterministic else RANDOM_IDS
+    output = io.BytesIO()
+    write_xmi_to_stream(spec, model_name, ea_root_class_name, output, stream=stream, dependencies=dependencies, ids=ids, workers=workers, dedupe_inline=dedupe_inline)
+    return output.getvalue()
+
+def convert_file(input_file, name=None, **options):
+    """Convert the specification in input_file and return the XMI file contents.
+
+    name defaults to the file name without its extension. See convert for the options.
+    """
+    try:
+        spec = load_spec(input_file)
+    except (yaml.YAMLError, json.JSONDecodeError, OSError) as e:
+        raise ConversionError(f"Error reading input file: {e}") from e
+    name = name or os.path.splitext(os.path.basename(input_file))[0]
+    return convert(spec, name=name, spec_path=input_file, **options)
+
+def add_dependencies(tree, deterministic=False):
+    """Add the dependencies between classes to a parsed XMI document, as add_dependencies_to_xmi.py does.
+
+    tree is an ElementTree or its root element, and is modified in place and returned.
+    """
+    root = tree.getroot() if isinstance(tree, ET.ElementTree) else tree
+    if root.find(f".//{UML}Package//{UML}Namespace.ownedElement") is None:
+        raise ConversionError("The XMI document has no package to add the dependencies to")
+    add_dependencies_to_root(root, deterministic=deterministic)
+    return tree
+
+def add_dependencies_to_bytes(xmi, deterministic=False):
+    """Add the dependencies between classes to the contents of an XMI file and return the new contents."""
+    try:
+        tree = ET.ElementTree(ET.fromstring(xmi))
+    except ET.ParseError as e:
+        raise ConversionError(f"Error reading input file: {e}") from e
+    add_dependencies(tree, deterministic=deterministic)
+    output = io.BytesIO()
+    tree.write(output, encoding='utf-8', xml_declaration=True)
+    return output.getvalue()
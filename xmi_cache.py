@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+# Default limit for the total size of the cached XMI files
+DEFAULT_CACHE_MAX_SIZE = 512 * 1024 * 1024
+
+# Source files whose content determines the generated XMI
+TOOL_SOURCES = ('convert_oas_to_xmi.py', 'add_dependencies_to_xmi.py', 'xmi_ids.py', 'xmi_model.py', 'xmi_refs.py')
+
+def tool_fingerprint():
+    """Hash the converter sources, so that any change to the tool invalidates the cache."""
+    digest = hashlib.sha256()
+    for source in TOOL_SOURCES:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), source), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def cache_key(spec, options):
+    """Return the cache key for a loaded specification and the options that affect the output.
+
+    The specification is normalised by serializing it with sorted keys, so changes
+    in formatting, key order or JSON/YAML syntax do not change the key.
+    """
+    digest = hashlib.sha256()
+    digest.update(tool_fingerprint().encode('utf-8'))
+    digest.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+    digest.update(json.dumps(spec, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+def cache_entry(cache_dir, key):
+    return os.path.join(cache_dir, f'{key}.xmi')
+
+def restore_from_cache(cache_dir, key, output_file):
+    """Copy the cached XMI for key to output_file. Returns False if there is no cached XMI."""
+    entry = cache_entry(cache_dir, key)
+    try:
+        shutil.copyfile(entry, output_file)
+    except FileNotFoundError:
+        return False
+    # Mark the entry as recently used for eviction
+    os.utime(entry)
+    return True
+
+def store_in_cache(cache_dir, key, output_file, max_size=DEFAULT_CACHE_MAX_SIZE):
+    """Store a copy of output_file for key, then evict the least recently used entries above max_size."""
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file first so concurrent readers never see a partial entry
+    fd, temporary_file = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    os.close(fd)
+    shutil.copyfile(output_file, temporary_file)
+    os.replace(temporary_file, cache_entry(cache_dir, key))
+    evict(cache_dir, max_size)
+
+def evict(cache_dir, max_size):
+    """Remove the least recently used entries until the cache is no larger than max_size."""
+    entries = []
+    for file_name in os.listdir(cache_dir):
+        if file_name.endswith('.xmi'):
+            try:
+                stat = os.stat(os.path.join(cache_dir, file_name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, file_name))
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, file_name in sorted(entries):
+        if total_size <= max_size:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, file_name))
+        except FileNotFoundError:
+            pass
+        total_size -= size
@@ -0,0 +1,103 @@
+import copy
+import datetime
+import os
+import uuid
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Namespace for all name-based UUIDs generated by these scripts
+DETERMINISTIC_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, 'https://github.com/dcsaorg/OpenAPISparxTransform')
+
+def default_timestamp():
+    """Timestamp used in deterministic mode: SOURCE_DATE_EPOCH if set, otherwise the Unix epoch."""
+    epoch = int(os.environ.get('SOURCE_DATE_EPOCH', '0'))
+    return datetime.datetime.fromtimestamp(epoch, datetime.UTC).strftime(TIMESTAMP_FORMAT)
+
+class RandomIds:
+    """Generate a new random UUID for every element and stamp the current time, as EA does."""
+
+    def uuid(self, *path):
+        return uuid.uuid4()
+
+    def timestamp(self):
+        return datetime.datetime.now(datetime.UTC).strftime(TIMESTAMP_FORMAT)
+
+class DeterministicIds:
+    """Generate name-based UUIDs from the path of each element within the model, and a fixed timestamp.
+
+    Converting the same specification twice gives byte-identical output. Paths that occur
+    more than once, such as two inline classes with the same title, are numbered in the
+    order they are generated.
+    """
+
+    def __init__(self, model_name, timestamp=None):
+        self.namespace = uuid.uuid5(DETERMINISTIC_NAMESPACE, model_name)
+        self.fixed_timestamp = timestamp or default_timestamp()
+        self.seen = {}
+
+    @staticmethod
+    def path_key(path):
+        return '/'.join('' if part is None else str(part) for part in path)
+
+    def uuid(self, *path):
+        name = self.path_key(path)
+        occurrence = self.seen.get(name, 0)
+        self.seen[name] = occurrence + 1
+        if occurrence:
+            name = f'{name}#{occurrence}'
+        return uuid.uuid5(self.namespace, name)
+
+    def timestamp(self):
+        return self.fixed_timestamp
+
+    def fork(self, seen):
+        """Return a copy that numbers repeated paths as if the paths counted in seen had already been generated.
+
+        This lets part of a model be converted in another process with the same ids as
+        a serial conversion.
+        """
+        forked = copy.copy(self)
+        forked.seen = dict(seen)
+        return forked
+
+RANDOM_IDS = RandomIds()
+
+class SharedIds:
+    """Wrap an id generator so that each path, and the timestamp, is only generated once.
+
+    The files of a split model all contain the model, the root class and the package
+    hierarchy; generating their ids through the same SharedIds gives these elements the
+    same ids in every file.
+    """
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.uuids = {}
+        self.fixed_timestamp = None
+
+    def uuid(self, *path):
+        if path not in self.uuids:
+            self.uuids[path] = self.ids.uuid(*path)
+        return self.uuids[path]
+
+    def timestamp(self):
+        if self.fixed_timestamp is None:
+            self.fixed_timestamp = self.ids.timestamp()
+        return self.fixed_timestamp
+
+def fork_ids(ids, run_paths):
+    """Return an id generator for each run of a conversion that is split across processes.
+
+    run_paths lists the paths of the uuids each run generates, in run order. With
+    DeterministicIds, each run continues the occurrence counts of the runs before it,
+    and ids ends up as after a serial conversion.
+    """
+    if not isinstance(ids, DeterministicIds):
+        return [ids] * len(run_paths)
+    run_ids = []
+    for paths in run_paths:
+        keys = [ids.path_key(path) for path in paths]
+        run_ids.append(ids.fork({key: ids.seen[key] for key in keys if key in ids.seen}))
+        for key in keys:
+            ids.seen[key] = ids.seen.get(key, 0) + 1
+    return run_ids
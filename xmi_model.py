@@ -0,0 +1,215 @@
+import hashlib
+import json
+import sys
+
+COMPOSITION_TYPES = ('oneOf', 'allOf', 'anyOf')
+
+class ModelClass:
+    """A class generated from a schema, or from an inline titled member of a schema composition.
+
+    index is the position of the class in Model.classes, which is the order in which
+    the classes appear in the XMI. Only classes generated from schemas have a
+    composition_type; its members are listed in composition_targets, and the inline
+    members among them in composition_classes.
+    """
+    __slots__ = ('index', 'name', 'description', 'attributes', 'composition_type', 'composition_targets', 'composition_classes')
+
+    def __init__(self, index, name, description):
+        self.index = index
+        self.name = name
+        self.description = description
+        self.attributes = []
+        self.composition_type = None
+        self.composition_targets = ()
+        self.composition_classes = ()
+
+class ModelAttribute:
+    """A property of a schema.
+
+    type, style and description are the strings written to the attribute's tagged
+    values. The classes the attribute refers to are listed in targets, with the
+    relation kind used by add_dependencies_to_xmi ('object',
+    'schema_composition_attribute' or 'array') and the dependency name. inline_classes holds the classes generated for the inline
+    members of a composition. example is the string form of the example, or None.
+    """
+    __slots__ = ('index', 'name', 'type', 'style', 'example', 'description', 'relation_kind', 'relation_name', 'targets', 'inline_classes')
+
+    def __init__(self, index, name):
+        self.index = index
+        self.name = name
+        self.type = 'string'
+        self.style = ''
+        self.example = None
+        self.description = ''
+        self.relation_kind = None
+        self.relation_name = None
+        self.targets = ()
+        self.inline_classes = ()
+
+class Model:
+    """The classes generated from components.schemas, in XMI order, and the schema classes among them.
+
+    inline_classes maps the canonical hash of an inline composition member to the class
+    created for it, when identical inline members share a class; otherwise it is None.
+    """
+    __slots__ = ('classes', 'schema_classes', 'attribute_count', 'inline_classes')
+
+    def __init__(self, dedupe_inline=False):
+        self.classes = []
+        self.schema_classes = []
+        self.attribute_count = 0
+        self.inline_classes = {} if dedupe_inline else None
+
+def ref_name(ref):
+    return sys.intern(ref.split('/')[-1])
+
+def text(value):
+    """Return value as written to the XMI: None becomes an empty string."""
+    return '' if value is None else str(value)
+
+def get_schema_composition(schema):
+    """Return the composition type and member list of a schema, or (None, None)."""
+    for composition_type in COMPOSITION_TYPES:
+        if composition_type in schema:
+            return composition_type, schema[composition_type]
+    return None, None
+
+def add_class(model, name, description):
+    model_class = ModelClass(len(model.classes), sys.intern(str(name)), text(description))
+    model.classes.append(model_class)
+    return model_class
+
+def schema_hash(schema):
+    """Return a hash of a schema that does not depend on key order."""
+    return hashlib.sha256(json.dumps(schema, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')).digest()
+
+def build_composition(model, composition_list, containing_class):
+    """Return the class names a schema composition refers to and the classes created for its inline members.
+
+    If the model shares inline classes, a member identical to one seen before refers
+    to the class created for that one instead of getting a class of its own.
+    """
+    targets = []
+    inline_classes = []
+    for ref in composition_list:
+        if '$ref' in ref:
+            targets.append(ref_name(ref['$ref']))
+        elif 'title' in ref:
+            if model.inline_classes is not None:
+                key = schema_hash(ref)
+                shared_class = model.inline_classes.get(key)
+                if shared_class is not None:
+                    targets.append(shared_class.name)
+                    continue
+            inline_class_name = f"{containing_class}.{ref['title']}" if containing_class else ref['title']
+            inline_class = add_class(model, inline_class_name, ref.get('description', ''))
+            if model.inline_classes is not None:
+                model.inline_classes[key] = inline_class
+            targets.append(inline_class.name)
+            inline_classes.append(inline_class)
+            build_attributes(model, inline_class, ref)
+    return tuple(targets), tuple(inline_classes)
+
+def build_attributes(model, model_class, schema):
+    """Add an attribute to model_class for every property of schema.
+
+    The classes for inline composition members are added to the model as they are
+    found, so that they directly follow the class they are declared in.
+    """
+    for property_name, property_schema in schema.get('properties', {}).items():
+        attribute = ModelAttribute(model.attribute_count, sys.intern(str(property_name)))
+        model.attribute_count += 1
+        model_class.attributes.append(attribute)
+
+        if 'example' in property_schema:
+            attribute.example = str(property_schema['example'])
+        attribute.description = text(property_schema.get('description', ''))
+
+        type_value = property_schema.get('type', 'string')
+        format_value = property_schema.get('format', '')
+        composition_type, composition_list = get_schema_composition(property_schema)
+        array_item_name = None
+
+        if '$ref' in property_schema:
+            format_value = ref_name(property_schema['$ref'])
+            type_value = 'object'
+
+        if composition_type:
+            attribute.targets, attribute.inline_classes = build_composition(model, composition_list, model_class.name)
+            format_value = f'{composition_type} ' + ', '.join(attribute.targets)
+            type_value = 'object'
+
+        if type_value == 'array' and 'items' in property_schema:
+            item_schema = property_schema['items']
+            if '$ref' in item_schema:
+                array_item_name = ref_name(item_schema['$ref'])
+            else:
+                array_item_name = item_schema.get('type', 'string')
+            format_value = f'Array of {array_item_name}'
+
+        if type_value == 'string' and not format_value and 'maxLength' in property_schema:
+            # Set format as "string(maxLength)"
+            format_value = f"string({property_schema['maxLength']})"
+
+        attribute.type = sys.intern(text(type_value))
+        attribute.style = text(format_value)
+
+        if composition_type:
+            attribute.relation_kind, attribute.relation_name = 'schema_composition_attribute', composition_type
+        elif type_value == 'object' and format_value:
+            attribute.relation_kind, attribute.targets = 'object', (attribute.style,)
+        elif type_value == 'array' and array_item_name is not None:
+            attribute.relation_kind, attribute.relation_name, attribute.targets = 'array', 'array', (array_item_name,)
+
+def build_model(spec, dedupe_inline=False):
+    """Build the model for the schemas in components.schemas.
+
+    The inline classes of class level schema compositions follow all other classes,
+    in schema order. With dedupe_inline, structurally identical inline composition
+    members share the class created for the first of them.
+    """
+    model = Model(dedupe_inline)
+    schemas = spec.get('components', {}).get('schemas', {})
+    for schema_name, schema in schemas.items():
+        model_class = add_class(model, schema_name, schema.get('description', ''))
+        model.schema_classes.append(model_class)
+        build_attributes(model, model_class, schema)
+
+    for model_class, schema in zip(model.schema_classes, schemas.values()):
+        composition_type, composition_list = get_schema_composition(schema)
+        if composition_type:
+            model_class.composition_type = composition_type
+            model_class.composition_targets, model_class.composition_classes = build_composition(model, composition_list, model_class.name)
+    return model
+
+def model_relations(model, class_ids, attribute_guids):
+    """Return the relations of the model in the form used by add_dependencies_to_xmi.resolve_dependencies.
+
+    class_ids and attribute_guids map the class and attribute indexes to the ids
+    they were given in the XMI.
+    """
+    class_index = []
+    class_relations = []
+    for model_class in model.classes:
+        class_name = model_class.name
+        class_id = class_ids[model_class.index]
+        relations = []
+        for attribute in model_class.attributes:
+            if attribute.relation_kind:
+                attribute_guid = attribute_guids[attribute.index]
+                relations.extend((attribute.relation_kind, class_name, class_id, target, attribute.relation_name, attribute_guid) for target in attribute.targets)
+        class_index.append(relations)
+        if model_class.composition_type:
+            class_relations.extend(('schema_composition_class', class_name, class_id, target, model_class.composition_type, None) for target in model_class.composition_targets)
+    class_index.append(class_relations)
+    return class_index
+
+def class_fingerprint(model_class):
+    """Return a hashable value covering everything written to the XMI for a class and its inline classes.
+
+    Classes with equal fingerprints give the same XMI when they are given the same ids.
+    """
+    return (model_class.name, model_class.description, model_class.composition_type, model_class.composition_targets, tuple(
+        (attribute.name, attribute.type, attribute.style, attribute.example, attribute.description, attribute.relation_kind, attribute.relation_name,
+         attribute.targets, tuple(class_fingerprint(inline_class) for inline_class in attribute.inline_classes))
+        for attribute in model_class.attributes))
@@ -0,0 +1,236 @@
+import os
+from collections import OrderedDict
+from urllib.parse import unquote
+
+# Number of parsed documents kept by a DocumentCache
+DEFAULT_MAX_DOCUMENTS = 64
+
+SCHEMAS_POINTER = '/components/schemas/'
+
+class UnresolvableReferenceError(ValueError):
+    """A $ref points to a missing document or location, or two different schemas would get the same class name."""
+
+def escape_pointer_token(token):
+    return str(token).replace('~', '~0').replace('/', '~1')
+
+def unescape_pointer_token(token):
+    return token.replace('~1', '/').replace('~0', '~')
+
+def index_pointers(document):
+    """Map the JSON pointer of every object and array in a document to the node, so that references are looked up in O(1)."""
+    index = {}
+    stack = [('', document)]
+    while stack:
+        pointer, node = stack.pop()
+        index[pointer] = node
+        if isinstance(node, dict):
+            items = node.items()
+        elif isinstance(node, list):
+            items = enumerate(node)
+        else:
+            continue
+        for key, value in items:
+            if isinstance(value, (dict, list)):
+                stack.append((f'{pointer}/{escape_pointer_token(key)}', value))
+    return index
+
+class DocumentCache:
+    """Parsed documents and their JSON pointer indexes, by absolute path.
+
+    load is called with the path to parse a document. A document is parsed again when
+    its modification time or size has changed, and the least recently used documents
+    are dropped when there are more than max_documents.
+    """
+
+    def __init__(self, load, max_documents=DEFAULT_MAX_DOCUMENTS):
+        self.load = load
+        self.max_documents = max_documents
+        self.documents = OrderedDict()
+
+    def get(self, path):
+        """Return the JSON pointer index of the document at path."""
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        entry = self.documents.get(path)
+        if entry is None or entry[0] != version:
+            entry = (version, index_pointers(self.load(path)))
+            self.documents[path] = entry
+        self.documents.move_to_end(path)
+        while len(self.documents) > self.max_documents:
+            self.documents.popitem(last=False)
+        return entry[1]
+
+class ExternalRefResolver:
+    """Bundle the schemas referenced from other documents into the components.schemas of a specification.
+
+    Locations are (path, pointer) pairs, with None as the path of the specification
+    itself. Every schema referenced from another document becomes a schema of its own,
+    named after the last segment of its pointer, or after the file name when the whole
+    document is referenced. References are rewritten to point to these schemas, so
+    build_model sees a self-contained specification.
+    """
+
+    def __init__(self, spec, spec_path, cache):
+        self.spec = spec
+        self.spec_path = os.path.abspath(spec_path) if spec_path else None
+        self.cache = cache
+        self.root_index = None
+        self.indexes = {}
+        self.names = {}
+        self.locations = {}
+        self.pending = []
+
+    def location(self, ref, path):
+        """Return the location a $ref found in the document at path refers to."""
+        file_part, _, fragment = ref.partition('#')
+        pointer = unquote(fragment)
+        if not file_part:
+            return path, pointer
+        if '://' in file_part:
+            raise UnresolvableReferenceError(f"{ref}: only references to local files are supported")
+        if path:
+            base_directory = os.path.dirname(path)
+        elif self.spec_path:
+            base_directory = os.path.dirname(self.spec_path)
+        else:
+            base_directory = os.getcwd()
+        target = os.path.normpath(os.path.join(base_directory, unquote(file_part)))
+        return (None if target == self.spec_path else target), pointer
+
+    def lookup(self, location, ref):
+        """Return the node at location, loading its document on first use."""
+        path, pointer = location
+        if path is None:
+            if self.root_index is None:
+                self.root_index = index_pointers(self.spec)
+            index = self.root_index
+        else:
+            index = self.indexes.get(path)
+            if index is None:
+                try:
+                    index = self.cache.get(path)
+                except OSError as e:
+                    raise UnresolvableReferenceError(f"{ref}: cannot read {path}: {e.strerror}")
+                self.indexes[path] = index
+        node = index.get(pointer)
+        if node is None:
+            raise UnresolvableReferenceError(f"{ref}: {pointer or '/'} not found in {path or 'the specification'}")
+        return node
+
+    def claim(self, name, location):
+        """Reserve a class name for the schema at location."""
+        owner = self.locations.setdefault(name, location)
+        if owner != location:
+            raise UnresolvableReferenceError(f"Two different schemas are named {name}: {describe(owner)} and {describe(location)}")
+
+    def name_for(self, location, ref):
+        """Return the class name of the schema at location, queueing the schema for bundling when it is first seen."""
+        name = self.names.get(location)
+        if name is None:
+            path, pointer = location
+            if path is None and pointer.startswith(SCHEMAS_POINTER) and pointer.count('/') == 3:
+                name = unescape_pointer_token(pointer[len(SCHEMAS_POINTER):])
+            else:
+                schema = self.lookup(location, ref)
+                if pointer:
+                    name = unescape_pointer_token(pointer.rsplit('/', 1)[1])
+                else:
+                    name = os.path.splitext(os.path.basename(path))[0]
+                self.claim(name, location)
+                self.pending.append((name, schema, path))
+            self.names[location] = name
+        return name
+
+    def rewrite(self, node, path):
+        """Return node with the $refs that leave the specification rewritten to point to bundled schemas.
+
+        Subtrees without such references are returned as they are rather than copied.
+        """
+        if isinstance(node, dict):
+            rewritten = None
+            for key, value in node.items():
+                if key == '$ref' and isinstance(value, str):
+                    if path is None and value.startswith('#'):
+                        continue
+                    new_value = SCHEMAS_POINTER.join(('#', self.name_for(self.location(value, path), value)))
+                elif isinstance(value, (dict, list)):
+                    new_value = self.rewrite(value, path)
+                    if new_value is value:
+                        continue
+                else:
+                    continue
+                if rewritten is None:
+                    rewritten = dict(node)
+                rewritten[key] = new_value
+            return node if rewritten is None else rewritten
+        if isinstance(node, list):
+            rewritten = None
+            for i, value in enumerate(node):
+                if isinstance(value, (dict, list)):
+                    new_value = self.rewrite(value, path)
+                    if new_value is not value:
+                        if rewritten is None:
+                            rewritten = list(node)
+                        rewritten[i] = new_value
+            return node if rewritten is None else rewritten
+        return node
+
+    def dereference(self, name, schema, path):
+        """Return the bundled content of the schema called name.
+
+        A schema that only refers to a schema in another document, such as
+        Address: {$ref: 'domain.yaml#/components/schemas/Address'}, takes the content of
+        that schema, so that the class has its attributes. Other keys next to the $ref
+        take precedence.
+        """
+        overrides = {}
+        seen = set()
+        while isinstance(schema, dict) and isinstance(schema.get('$ref'), str):
+            ref = schema['$ref']
+            location = self.location(ref, path)
+            if location[0] is None or location in seen:
+                break
+            seen.add(location)
+            self.names.setdefault(location, name)
+            siblings = {key: value for key, value in schema.items() if key != '$ref'}
+            overrides = {**self.rewrite(siblings, path), **overrides}
+            schema, path = self.lookup(location, ref), location[0]
+        if not seen:
+            return self.rewrite(schema, path)
+        return {**self.rewrite(schema, path), **overrides}
+
+    def resolve(self):
+        components = self.spec.get('components') or {}
+        schemas = components.get('schemas') or {}
+        for name in schemas:
+            self.locations[name] = (None, SCHEMAS_POINTER + escape_pointer_token(name))
+        # Aliases are registered first, so that references to their targets use the local name
+        for name, schema in schemas.items():
+            ref = schema.get('$ref') if isinstance(schema, dict) else None
+            if isinstance(ref, str) and not ref.startswith('#'):
+                self.names.setdefault(self.location(ref, None), name)
+
+        bundled = {name: self.dereference(name, schema, None) for name, schema in schemas.items()}
+        while self.pending:
+            name, schema, path = self.pending.pop(0)
+            bundled[name] = self.dereference(name, schema, path)
+
+        if len(bundled) == len(schemas) and all(bundled[name] is schema for name, schema in schemas.items()):
+            return self.spec
+        spec = dict(self.spec)
+        spec['components'] = {**components, 'schemas': bundled}
+        return spec
+
+def describe(location):
+    path, pointer = location
+    return f"{path or ''}#{pointer}"
+
+def resolve_external_refs(spec, spec_path, cache):
+    """Return spec with the schemas it references in other documents added to components.schemas.
+
+    spec_path is the file the specification was loaded from, or None for stdin; relative
+    references are resolved against its directory, or the current directory. Documents
+    are loaded through cache, a DocumentCache. A specification without references to
+    other documents is returned unchanged.
+    """
+    return ExternalRefResolver(spec, spec_path, cache).resolve()
@@ -0,0 +1,132 @@
+import contextlib
+import cProfile
+import functools
+import json
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+def null_phase(name):
+    """Stand-in for Stats.phase when no statistics are collected."""
+    return contextlib.nullcontext()
+
+class Stats:
+    """Collect wall and CPU time per phase, element counts and, while tracemalloc is tracing, peak memory.
+
+    Phases can be nested. The time reported for a phase excludes the time spent in
+    the phases nested inside it, so the phase times add up to the total.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.counts = Counter()
+        self.stack = []
+        self.patched = []
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+
+    def _add_time(self, name, wall, cpu):
+        phase = self.phases.setdefault(name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0})
+        phase['wall'] += wall
+        phase['cpu'] += cpu
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        wall, cpu = time.perf_counter(), time.process_time()
+        if self.stack:
+            parent = self.stack[-1]
+            self._add_time(parent[0], wall - parent[1], cpu - parent[2])
+        elif tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        entry = [name, wall, cpu]
+        self.stack.append(entry)
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter(), time.process_time()
+            self.stack.pop()
+            self._add_time(name, wall - entry[1], cpu - entry[2])
+            self.phases[name]['calls'] += 1
+            if self.stack:
+                self.stack[-1][1:] = [wall, cpu]
+            elif tracemalloc.is_tracing():
+                # Peak memory is only tracked for top level phases
+                phase = self.phases[name]
+                phase['peak_memory'] = max(phase.get('peak_memory', 0), tracemalloc.get_traced_memory()[1])
+
+    def instrument(self, module, function_name, phase=True, count=None):
+        """Replace a module function with a wrapper that times it as a phase and/or counts its results.
+
+        count is called as count(counts, args, result) after every call. Calls made
+        through the module global, including recursive ones, go through the wrapper
+        until restore is called.
+        """
+        function = getattr(module, function_name)
+        stats = self
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if phase:
+                with stats.phase(function_name):
+                    result = function(*args, **kwargs)
+            else:
+                result = function(*args, **kwargs)
+            if count:
+                count(stats.counts, args, result)
+            return result
+
+        self.patched.append((module, function_name, function))
+        setattr(module, function_name, wrapper)
+
+    def restore(self):
+        for module, function_name, function in reversed(self.patched):
+            setattr(module, function_name, function)
+        self.patched = []
+
+    def report(self):
+        report = {
+            'total': {'wall': time.perf_counter() - self.start_wall, 'cpu': time.process_time() - self.start_cpu},
+            'phases': self.phases,
+            'counts': dict(self.counts),
+        }
+        if tracemalloc.is_tracing():
+            report['peak_memory'] = max([phase.get('peak_memory', 0) for phase in self.phases.values()] + [tracemalloc.get_traced_memory()[1]])
+        return report
+
+@contextlib.contextmanager
+def profiling(stats_file=None, profile_file=None, instrument=None, trace_memory=False):
+    """Collect statistics and/or a cProfile profile around a block.
+
+    Yields the phase function to use in the block. If stats_file is given, a JSON
+    report is written to it ('-' for stderr) when the block exits; instrument is then
+    called with the Stats instance to wrap the functions of interest. The peak memory
+    is only reported with trace_memory, as tracing every allocation slows the run down
+    several times and distorts the phase times.
+    """
+    stats = Stats() if stats_file else None
+    profiler = cProfile.Profile() if profile_file else None
+    if stats:
+        if trace_memory:
+            tracemalloc.start()
+        if instrument:
+            instrument(stats)
+    if profiler:
+        profiler.enable()
+    try:
+        yield stats.phase if stats else null_phase
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile_file)
+        if stats:
+            stats.restore()
+            report = stats.report()
+            if trace_memory:
+                tracemalloc.stop()
+            if stats_file == '-':
+                json.dump(report, sys.stderr, indent=2)
+                sys.stderr.write('\n')
+            else:
+                with open(stats_file, 'w', encoding='utf-8') as f:
+                    json.dump(report, f, indent=2)